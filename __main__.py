@@ -39,6 +39,14 @@ def main():
                 generations=config.generations,
                 compute_time=config.compute_time,
                 n_jobs=config.n_jobs,
+                type_space=config.type_space,
+                type_encoding=config.type_encoding,
+                num_islands=config.num_islands,
+                migration_interval=config.migration_interval,
+                num_migrants=config.num_migrants,
+                topology=config.topology,
+                cache_size=config.cache_size,
+                compact_rate=config.compact_rate,
             )
             genetic.run()
             results = {
@@ -52,7 +60,23 @@ def main():
                 'survivors': config.survivors,
                 'mutation_rate': config.mutation_rate,
                 'compute_time': config.compute_time,
+                'num_islands': config.num_islands,
+                'cache_size': config.cache_size,
+                'compact_rate': config.compact_rate,
             }
+            if config.num_islands > 1:
+                results['migration_interval'] = config.migration_interval
+                results['num_migrants'] = config.num_migrants
+                results['topology'] = config.topology
+                results['islas'] = [
+                    {
+                        'mejores_individuos': island.best_individuals,
+                        'peores_individuos': island.worst_individuals,
+                        'fitness_promedio': island.average_fitnesses,
+                        'fitness_mediana': island.median_fitnesses,
+                    }
+                    for island in genetic.islands
+                ]
             if not isdir("resultados_genetico"):
                 makedirs("resultados_genetico")
             with open(f"resultados_genetico/{config.name}.json", "w") as f:
@@ -70,6 +94,13 @@ def main():
                 iterations=config.iterations,
                 compute_time=config.compute_time,
                 n_jobs=config.n_jobs,
+                type_space=config.type_space,
+                type_encoding=config.type_encoding,
+                num_chains=config.num_chains,
+                swap_interval=config.swap_interval,
+                temperature_ratio=config.temperature_ratio,
+                batch_size=config.batch_size,
+                compact_rate=config.compact_rate,
             )
             simulated_annealing.run()
             results = {
@@ -81,7 +112,24 @@ def main():
                 'k': config.k,
                 'type_update': config.type_update,
                 'compute_time': config.compute_time,
+                'num_chains': config.num_chains,
+                'batch_size': config.batch_size,
+                'compact_rate': config.compact_rate,
             }
+            if config.num_chains > 1:
+                results['cadenas'] = [
+                    {
+                        'T_init': chain.T_init,
+                        'soluciones': fitnesses,
+                        'temperaturas': Ts,
+                        'mejor_solucion': chain.best_fitness,
+                    }
+                    for chain, fitnesses, Ts in zip(
+                        simulated_annealing.chains,
+                        simulated_annealing.chain_fitnesses,
+                        simulated_annealing.chain_Ts,
+                    )
+                ]
             if not isdir("resultados_enfriamiento_simulado"):
                 makedirs("resultados_enfriamiento_simulado")
             with open(f"resultados_enfriamiento_simulado/{config.name}.json", "w") as f:
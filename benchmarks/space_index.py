@@ -0,0 +1,65 @@
+"""
+Benchmark del costo por colocacion de bloques en el espacio a medida que
+crece el numero de bloques, con y sin el indice espacial por filas.
+
+Ejecucion desde la raiz del repositorio:
+
+    python -m benchmarks.space_index
+"""
+import argparse
+from copy import deepcopy
+from random import seed, random
+from time import perf_counter
+
+from loguru import logger
+
+from coating_mod_2d.coating_mod_2d import CoatingMod2D
+from coating_mod_2d.space import Space, new_space, BOTTOM_MAX
+
+
+def place_blocks(type_space: str, width: int, blocks: list, bucket_height: int) -> float:
+    """
+    Coloca los bloques en orden en la fila valida mas baja y devuelve el
+    tiempo promedio por colocacion en segundos
+    """
+    space = new_space(type_space, width=width, all_blocks=blocks)
+    space.bucket_height = bucket_height
+    tic = perf_counter()
+    for block in blocks:
+        blockp = deepcopy(block)
+        if random() < 0.5:
+            blockp.rotate()
+        xs = list(range(space.width - blockp.width + 1))
+        bottom = space.bottom_range(blockp.n)[0]
+        while True:
+            valid = space.valid_positions(blockp, xs, bottom)
+            if valid.any():
+                blockp.localize(xs[int(valid.argmax())], bottom)
+                space.add_block(blockp)
+                break
+            bottom += 1
+    return (perf_counter() - tic) / len(blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', '-s', type=int, nargs='+', default=[20, 100, 500, 1000, 2000, 5000])
+    parser.add_argument('--width', '-w', type=int, default=9)
+    parser.add_argument('--type_space', '-t', type=str, default='grid', choices=['grid', 'skyline'])
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'bloques':>8} {'con indice (us)':>16} {'sin indice (us)':>16} {'speedup':>8}")
+    for size in args.sizes:
+        seed(2022)
+        blocks = CoatingMod2D('benchmark', size, args.width).blocks
+        seed(2022)
+        indexed = place_blocks(args.type_space, args.width, blocks, bucket_height=Space.bucket_height)
+        seed(2022)
+        # un solo balde equivale a revisar todos los bloques del espacio
+        full_scan = place_blocks(args.type_space, args.width, blocks, bucket_height=BOTTOM_MAX)
+        print(f"{size:>8} {indexed * 1e6:>16.1f} {full_scan * 1e6:>16.1f} {full_scan / indexed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,139 @@
 """
 Clase de bloque
 """
+from typing import List, Union, Iterator
+
+from numpy import ndarray, zeros, int64, maximum, minimum
+
+# columnas del arreglo de un conjunto de bloques
+N, WIDTH, HEIGHT, LEFT, BOTTOM, LOCATED = range(6)
+NUM_COLUMNS = 6
+
+
+class BlockSet:
+    """
+    Conjunto de bloques guardado en un arreglo contiguo
+    (bloque x [n, width, height, left, bottom, located]). Copiarlo es copiar
+    el arreglo y los bloques que entrega son vistas sobre sus filas
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data: ndarray) -> None:
+        self.data = data
+
+    @classmethod
+    def empty(cls, num_blocks: int) -> "BlockSet":
+        """
+        Conjunto de num_blocks bloques sin dimensiones ni posicion
+        """
+        return cls(zeros((num_blocks, NUM_COLUMNS), dtype=int64))
+
+    @classmethod
+    def from_blocks(cls, blocks: List["Block"]) -> "BlockSet":
+        """
+        Conjunto con una copia de los bloques
+        """
+        blockset = cls.empty(len(blocks))
+        for row, block in enumerate(blocks):
+            blockset.data[row] = block.blockset.data[block.row]
+        return blockset
+
+    def copy(self) -> "BlockSet":
+        return BlockSet(self.data.copy())
+
+    def __copy__(self) -> "BlockSet":
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> "BlockSet":
+        return self.copy()
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, index: Union[int, slice]) -> Union["Block", "BlockSet"]:
+        if isinstance(index, slice):
+            return BlockSet(self.data[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indice de bloque fuera de rango")
+        return Block.view(self, index)
+
+    def __iter__(self) -> Iterator["Block"]:
+        for row in range(len(self)):
+            yield Block.view(self, row)
+
+    @property
+    def n(self) -> ndarray:
+        return self.data[:, N]
+
+    @property
+    def width(self) -> ndarray:
+        return self.data[:, WIDTH]
+
+    @property
+    def height(self) -> ndarray:
+        return self.data[:, HEIGHT]
+
+    @property
+    def left(self) -> ndarray:
+        return self.data[:, LEFT]
+
+    @property
+    def bottom(self) -> ndarray:
+        return self.data[:, BOTTOM]
+
+    @property
+    def right(self) -> ndarray:
+        return self.data[:, LEFT] + self.data[:, WIDTH] - 1
+
+    @property
+    def top(self) -> ndarray:
+        return self.data[:, BOTTOM] + self.data[:, HEIGHT] - 1
+
+    @property
+    def area(self) -> ndarray:
+        return self.data[:, WIDTH] * self.data[:, HEIGHT]
+
+    def localize(self, left: ndarray, bottom: ndarray, rows=slice(None)) -> "BlockSet":
+        """
+        Localiza los bloques de las filas rows
+        """
+        self.data[rows, LEFT] = left
+        self.data[rows, BOTTOM] = bottom
+        self.data[rows, LOCATED] = 1
+        return self
+
+    def rotate(self, rows=slice(None)) -> "BlockSet":
+        """
+        Rota los bloques de las filas rows
+        """
+        self.data[rows, WIDTH], self.data[rows, HEIGHT] = (
+            self.data[rows, HEIGHT].copy(),
+            self.data[rows, WIDTH].copy(),
+        )
+        return self
+
+    def intersection_area(self, block: "Block") -> ndarray:
+        """
+        Area de la interseccion de cada bloque del conjunto con un bloque
+        """
+        dx = minimum(self.right, block.right) - maximum(self.left, block.left) + 1
+        dy = minimum(self.top, block.top) - maximum(self.bottom, block.bottom) + 1
+        return dx.clip(min=0) * dy.clip(min=0)
+
+    def __repr__(self) -> str:
+        return "BlockSet({})".format(list(self))
+
 
 class Block:
     """
-    Clase de bloque que se pondra en el espacio de trabajo
+    Clase de bloque que se pondra en el espacio de trabajo. Es una vista
+    sobre una fila de un BlockSet, un bloque creado directamente tiene su
+    propio conjunto de una fila
     """
+    __slots__ = ('blockset', 'row')
+
     def __init__(
         self,
         n: int,
@@ -14,34 +142,89 @@ class Block:
         left: int = None,
         bottom: int = None,
     ) -> None:
-        self.n = n
-        self.width = width
-        self.height = height
-        self.area = self.width * self.height
+        self.blockset = BlockSet.empty(1)
+        self.row = 0
+        self.blockset.data[0, :LEFT] = (n, width, height)
         if left is not None and bottom is not None:
             self.localize(left, bottom)
-        else:
-            self.left = None
-            self.top = None
-            self.right = None
-            self.bottom = None
+
+    @classmethod
+    def view(cls, blockset: BlockSet, row: int) -> "Block":
+        """
+        Bloque que es una vista de la fila row de un conjunto
+        """
+        block = cls.__new__(cls)
+        block.blockset = blockset
+        block.row = row
+        return block
+
+    def copy(self) -> "Block":
+        """
+        Copia independiente del bloque
+        """
+        return Block.view(BlockSet(self.blockset.data[self.row:self.row+1].copy()), 0)
+
+    def __copy__(self) -> "Block":
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> "Block":
+        return self.copy()
+
+    def __reduce__(self):
+        return (Block, (self.n, self.width, self.height, self.left, self.bottom))
+
+    @property
+    def n(self) -> int:
+        return self.blockset.data.item(self.row, N)
+
+    @property
+    def width(self) -> int:
+        return self.blockset.data.item(self.row, WIDTH)
+
+    @property
+    def height(self) -> int:
+        return self.blockset.data.item(self.row, HEIGHT)
+
+    @property
+    def area(self) -> int:
+        return self.width * self.height
+
+    @property
+    def left(self) -> int:
+        if not self.blockset.data.item(self.row, LOCATED):
+            return None
+        return self.blockset.data.item(self.row, LEFT)
+
+    @property
+    def bottom(self) -> int:
+        if not self.blockset.data.item(self.row, LOCATED):
+            return None
+        return self.blockset.data.item(self.row, BOTTOM)
+
+    @property
+    def right(self) -> int:
+        if not self.blockset.data.item(self.row, LOCATED):
+            return None
+        return self.blockset.data.item(self.row, LEFT) + self.blockset.data.item(self.row, WIDTH) - 1
+
+    @property
+    def top(self) -> int:
+        if not self.blockset.data.item(self.row, LOCATED):
+            return None
+        return self.blockset.data.item(self.row, BOTTOM) + self.blockset.data.item(self.row, HEIGHT) - 1
 
     def localize(self, left: int, bottom: int) -> None:
         """
         Localiza el bloque en una posicion
         """
-        self.left = left
-        self.bottom = bottom
-        self.right = self.left + self.width - 1
-        self.top = self.bottom + self.height - 1
+        self.blockset.data[self.row, LEFT:] = (left, bottom, 1)
 
     def rotate(self) -> None:
         """
         Rota el bloque
         """
-        self.width, self.height = self.height, self.width
-        if self.left is not None and self.bottom is not None:
-            self.localize(self.left, self.bottom)
+        data = self.blockset.data
+        data[self.row, WIDTH], data[self.row, HEIGHT] = data.item(self.row, HEIGHT), data.item(self.row, WIDTH)
 
     def intersection(self, block2: "Block") -> bool:
         """
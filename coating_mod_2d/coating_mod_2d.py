@@ -1,11 +1,10 @@
 """
 Clase del problema general
 """
-from typing import List
 from loguru import logger
 from random import randint
 
-from coating_mod_2d.block import Block
+from coating_mod_2d.block import BlockSet, N, WIDTH, HEIGHT
 
 
 class CoatingMod2D:
@@ -21,18 +20,15 @@ class CoatingMod2D:
         self.blocks = self.generate_blocks()
         self.info()
 
-    def generate_blocks(self) -> List[Block]:
+    def generate_blocks(self) -> BlockSet:
         """
         Genera los bloque n que entraran al espacio de diseño
         """
-        new_blocks = []
+        new_blocks = BlockSet.empty(self.num_blocks)
         for n in range(self.num_blocks):
-            block = Block(
-                n = n+1,
-                width = randint(1, int(self.space_width/1.8)),
-                height = randint(1, int(self.space_width/1.8)),
-            )
-            new_blocks.append(block)
+            new_blocks.data[n, N] = n+1
+            new_blocks.data[n, WIDTH] = randint(1, int(self.space_width/1.8))
+            new_blocks.data[n, HEIGHT] = randint(1, int(self.space_width/1.8))
         return new_blocks
 
     def info(self) -> None:
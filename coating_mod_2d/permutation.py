@@ -0,0 +1,108 @@
+"""
+Codificacion por permutacion: un genoma es una permutacion de los n de los
+bloques mas un bit de rotacion por bloque, y el layout se construye con la
+heuristica de colocacion del espacio (bottom-left-fill o skyline)
+"""
+from typing import List, Tuple
+from copy import deepcopy
+from random import random, randint, sample, choice
+
+from coating_mod_2d.block import Block
+from coating_mod_2d.space import Space
+
+
+def decode(space: Space, blocks: List[Block], permutation: List[int], rotations: List[int]) -> bool:
+    """
+    Coloca los bloques en el espacio en el orden de la permutacion, cada uno
+    en la posicion mas baja y a la izquierda que respete el orden de los
+    bloques. rotations[n-1] indica si el bloque n va rotado. Devuelve False
+    si algun bloque no tiene posicion valida
+    """
+    blocks_by_n = {block.n: block for block in blocks}
+    for n in permutation:
+        block = deepcopy(blocks_by_n[n])
+        if rotations[n-1]:
+            block.rotate()
+        low, high = space.bottom_range(n)
+        position = space.lowest_position(block, low, high)
+        if position is None:
+            return False
+        block.localize(*position)
+        space.add_block(block)
+    return True
+
+
+def random_genome(blocks: List[Block], jitter: float = 3) -> Tuple[List[int], List[int]]:
+    """
+    Genera un genoma aleatorio. La permutacion es el orden de los n
+    desordenado localmente (cada n se desplaza en promedio jitter posiciones),
+    ya que los bloques que se alejan mucho de su orden rara vez tienen
+    posicion valida
+    """
+    permutation = sorted([block.n for block in blocks], key=lambda n: n + random() * jitter)
+    rotations = [randint(0, 1) for _ in blocks]
+    return permutation, rotations
+
+
+def order_crossover(parent1: List[int], parent2: List[int]) -> List[int]:
+    """
+    Cruce OX: copia un tramo del primer padre y completa con los genes
+    restantes en el orden en que aparecen en el segundo
+    """
+    size = len(parent1)
+    start, end = sorted(sample(range(size + 1), 2))
+    segment = parent1[start:end]
+    in_segment = set(segment)
+    rest = [n for n in parent2[end:] + parent2[:end] if n not in in_segment]
+    child = rest[size-end:] + segment + rest[:size-end]
+    return child
+
+
+def uniform_crossover(parent1: List[int], parent2: List[int]) -> List[int]:
+    """
+    Cruce uniforme de los bits de rotacion
+    """
+    return [choice(pair) for pair in zip(parent1, parent2)]
+
+
+def swap_mutation(permutation: List[int]) -> List[int]:
+    """
+    Intercambia dos posiciones de la permutacion
+    """
+    permutation = list(permutation)
+    i, j = sample(range(len(permutation)), 2)
+    permutation[i], permutation[j] = permutation[j], permutation[i]
+    return permutation
+
+
+def insert_mutation(permutation: List[int]) -> List[int]:
+    """
+    Saca un gen de la permutacion y lo inserta en otra posicion
+    """
+    permutation = list(permutation)
+    i, j = sample(range(len(permutation)), 2)
+    permutation.insert(j, permutation.pop(i))
+    return permutation
+
+
+def rotate_flip_mutation(rotations: List[int]) -> List[int]:
+    """
+    Invierte el bit de rotacion de un bloque
+    """
+    rotations = list(rotations)
+    i = randint(0, len(rotations) - 1)
+    rotations[i] = 1 - rotations[i]
+    return rotations
+
+
+def mutate_genome(permutation: List[int], rotations: List[int]) -> Tuple[List[int], List[int]]:
+    """
+    Aplica al genoma una mutacion al azar entre swap, insert y rotate-flip
+    """
+    operator = randint(0, 2)
+    if operator == 0:
+        return swap_mutation(permutation), rotations
+    elif operator == 1:
+        return insert_mutation(permutation), rotations
+    else:
+        return permutation, rotate_flip_mutation(rotations)
@@ -1,17 +1,42 @@
 """
 Clase del espacio donde entraran los bloques
 """
-from typing import List
-from copy import deepcopy
+from typing import List, Tuple, Dict, Set, Optional
+from copy import copy
+from heapq import heappush, heappop, heapify
 from loguru import logger
-from numpy import zeros, int8
+from numpy import (
+    zeros, full, int8, int32, iinfo, maximum, minimum, flatnonzero, diff, atleast_1d,
+    broadcast_to, ndarray, concatenate, fromiter, arange, where, tile, repeat, isin, lexsort,
+)
+from numpy.lib.stride_tricks import sliding_window_view
 
 from coating_mod_2d.block import Block
 
+# columnas del arreglo de coordenadas de los bloques en el espacio
+LEFT, RIGHT, BOTTOM, TOP, N = range(5)
+BOTTOM_MAX = int(iinfo(int32).max)
+
 class Space:
     """
     Espacio de trabajo donde entraran los bloques
     """
+    # alto de cada balde del indice espacial por filas
+    bucket_height = 8
+    # estructuras que un snapshot comparte con el original hasta modificarlas
+    copy_on_write = (
+        'blocks_in',
+        'space',
+        'coords',
+        'row_buckets',
+        'tops_heap',
+        'tops_removed',
+        'bottom_low',
+        'bottom_high',
+        'prefix_max_bottom',
+        'suffix_min_bottom',
+    )
+
     def __init__(
         self,
         width: int,
@@ -19,13 +44,84 @@ class Space:
         blocks_in: List[Block] = list(),
     ) -> None:
         self.width = width
-        self.blocks_in = deepcopy(blocks_in)
-        self.max_height = self.get_max_height(deepcopy(all_blocks))
-        self.min_height = self.get_min_height(deepcopy(all_blocks))
+        self.shared = set()
+        self.blocks_in = [block.copy() for block in blocks_in]
+        self.max_height = self.get_max_height(all_blocks)
+        self.min_height = self.get_min_height(all_blocks)
+        # la grilla guarda el n de cada bloque, int8 alcanza solo hasta 127 bloques
+        max_n = max([block.n for block in all_blocks] + [block.n for block in self.blocks_in], default=0)
+        self.dtype = int8 if max_n <= iinfo(int8).max else int32
         self.height_ocupped = 0
         self.area_not_ocupped = self.width * self.height_ocupped
+        # multiconjunto de tops (heap de maximos con borrado perezoso) y area ocupada
+        self.tops_heap: List[int] = []
+        self.tops_removed: Dict[int, int] = {}
+        self.area_ocupped = 0
+        self.coords = zeros((max(len(all_blocks), len(self.blocks_in), 1), 5), dtype=int32)
+        self.row_buckets: Dict[int, Set[int]] = {}
+        # bottom de cada bloque por n y sus maximos prefijos / minimos sufijos,
+        # validos hasta prefix_valid y desde suffix_valid
+        self.bottom_low = full(max_n + 2, -1, dtype=int32)
+        self.bottom_high = full(max_n + 2, BOTTOM_MAX, dtype=int32)
+        self.prefix_max_bottom = self.bottom_low.copy()
+        self.suffix_min_bottom = self.bottom_high.copy()
+        self.prefix_valid = max_n + 1
+        self.suffix_valid = 0
+        for index, block in enumerate(self.blocks_in):
+            self.set_block_coords(index, block)
+            self.index_block(index)
+        self.init_space()
+        for block in self.blocks_in:
+            self.add_block_in_space(block)
+            self.track_block(block)
+        self.set_height_ocupped()
+        self.set_area_not_ocupped()
+
+    def init_space(self) -> "Space":
+        """
+        Inicializa la grilla de ocupacion del espacio
+        """
         # self.space = [[0 for _ in range(self.width)] for _ in range(self.max_height)]
-        self.space = zeros((self.max_height, self.width), dtype=int8)
+        self.space = zeros((self.max_height, self.width), dtype=self.dtype)
+        return self
+
+    def snapshot(self) -> "Space":
+        """
+        Copia del espacio en O(1). Comparte las estructuras con el original y
+        cada uno copia una estructura recien la primera vez que la modifica
+        """
+        clone = copy(self)
+        self.shared = set(self.copy_on_write)
+        clone.shared = set(self.copy_on_write)
+        return clone
+
+    def __deepcopy__(self, memo: dict) -> "Space":
+        return self.snapshot()
+
+    def own(self, *names: str) -> "Space":
+        """
+        Copia las estructuras compartidas con otro snapshot antes de modificarlas
+        """
+        for name in names:
+            if name in self.shared:
+                self.shared.discard(name)
+                setattr(self, name, self.copy_structure(name))
+        return self
+
+    def copy_structure(self, name: str):
+        """
+        Copia de una estructura del espacio
+        """
+        value = getattr(self, name)
+        if name == 'space' and value is not None:
+            # sobre height_ocupped la grilla esta vacia, basta copiar las filas ocupadas
+            rows = min(self.height_ocupped + 1, len(value))
+            grid = zeros(value.shape, dtype=value.dtype)
+            grid[:rows] = value[:rows]
+            return grid
+        if name == 'row_buckets':
+            return {bucket: set(indexes) for bucket, indexes in value.items()}
+        return copy(value)
 
     @staticmethod
     def get_max_height(blocks: List[Block]) -> int:
@@ -51,22 +147,34 @@ class Space:
 
     def set_height_ocupped(self) -> "Space":
         """
-        Calcula la altura ocupada por los bloques
+        Calcula la altura ocupada por los bloques a partir del heap de tops
         """
-        self.height_ocupped = 0
-        for block in self.blocks_in:
-            if block.top > self.height_ocupped:
-                self.height_ocupped = block.top
+        if len(self.tops_heap) > 2 * len(self.blocks_in):
+            self.rebuild_tops()
+        while self.tops_heap and self.tops_removed.get(-self.tops_heap[0], 0) > 0:
+            self.own('tops_heap', 'tops_removed')
+            self.tops_removed[-self.tops_heap[0]] -= 1
+            heappop(self.tops_heap)
+        self.height_ocupped = max(-self.tops_heap[0], 0) if self.tops_heap else 0
         logger.trace("Height ocupped: {}", self.height_ocupped)
         return self
 
+    def rebuild_tops(self) -> "Space":
+        """
+        Reconstruye el heap de tops solo con los bloques del espacio, para
+        que las entradas borradas no se acumulen
+        """
+        self.tops_heap = (-self.coords[:len(self.blocks_in), TOP]).tolist()
+        heapify(self.tops_heap)
+        self.tops_removed = {}
+        self.shared.difference_update(('tops_heap', 'tops_removed'))
+        return self
+
     def set_area_not_ocupped(self) -> "Space":
         """
-        Calcula el area no ocupada por los bloques
+        Calcula el area no ocupada por los bloques a partir del area ocupada acumulada
         """
-        self.area_not_ocupped = (self.width+1) * self.height_ocupped
-        for block in self.blocks_in:
-            self.area_not_ocupped -= block.area
+        self.area_not_ocupped = (self.width+1) * self.height_ocupped - self.area_ocupped
         logger.trace("Area not ocupped: {}", self.area_not_ocupped)
         return self
 
@@ -97,30 +205,350 @@ class Space:
         """
         Agrega un bloque al espacio de trabajo
         """
+        self.own('blocks_in')
         self.blocks_in.append(block)
+        self.set_block_coords(len(self.blocks_in) - 1, block)
+        self.index_block(len(self.blocks_in) - 1)
         self.add_block_in_space(block)
+        self.track_block(block)
+        self.set_height_ocupped()
+        self.set_area_not_ocupped()
+        return self
+
+    def remove_block(self, index: int) -> Block:
+        """
+        Quita el bloque en la posicion index del espacio de trabajo.
+        Los bloques siguientes se corren una posicion hacia atras
+        """
+        self.unindex_block(index)
+        self.own('blocks_in', 'coords')
+        block = self.blocks_in.pop(index)
+        num_blocks = len(self.blocks_in)
+        self.coords[index:num_blocks] = self.coords[index+1:num_blocks+1]
+        self.row_buckets = {
+            bucket: {i - 1 if i > index else i for i in indexes}
+            for bucket, indexes in self.row_buckets.items()
+        }
+        self.set_block_bottom(block.n, None)
+        self.remove_block_in_space(block)
+        self.untrack_block(block)
         self.set_height_ocupped()
         self.set_area_not_ocupped()
+        return block
+
+    def track_block(self, block: Block) -> "Space":
+        """
+        Suma el top y el area del bloque a la altura y area ocupadas
+        """
+        self.own('tops_heap')
+        heappush(self.tops_heap, -block.top)
+        self.area_ocupped += block.area
+        return self
+
+    def untrack_block(self, block: Block) -> "Space":
+        """
+        Resta el top y el area del bloque de la altura y area ocupadas
+        """
+        self.own('tops_removed')
+        self.tops_removed[block.top] = self.tops_removed.get(block.top, 0) + 1
+        self.area_ocupped -= block.area
         return self
 
     def add_block_in_space(self, block: Block) -> "Space":
         """
         Agrega un bloque al espacio de trabajo
         """
+        self.own('space')
         self.space[block.bottom:block.top+1, block.left:block.right+1] = block.n
         return self
 
+    def remove_block_in_space(self, block: Block) -> "Space":
+        """
+        Quita un bloque del espacio de trabajo
+        """
+        self.own('space')
+        self.space[block.bottom:block.top+1, block.left:block.right+1] = 0
+        return self
+
+    def set_block_coords(self, index: int, block: Block) -> "Space":
+        """
+        Guarda las coordenadas de un bloque en el arreglo de coordenadas
+        """
+        self.own('coords')
+        if index >= len(self.coords):
+            self.coords = concatenate([self.coords, zeros(self.coords.shape, dtype=int32)])
+        self.coords[index] = (block.left, block.right, block.bottom, block.top, block.n)
+        self.set_block_bottom(block.n, block.bottom)
+        return self
+
+    def set_block_bottom(self, n: int, bottom: int) -> "Space":
+        """
+        Actualiza el bottom del bloque n (None si sale del espacio) e invalida
+        los maximos prefijos y minimos sufijos que dependen de el
+        """
+        self.own('bottom_low', 'bottom_high', 'prefix_max_bottom', 'suffix_min_bottom')
+        if n + 1 >= len(self.bottom_low):
+            self.prefix_valid = min(self.prefix_valid, len(self.bottom_low) - 1)
+            grow = n + 2 - len(self.bottom_low)
+            self.bottom_low = concatenate([self.bottom_low, full(grow, -1, dtype=int32)])
+            self.bottom_high = concatenate([self.bottom_high, full(grow, BOTTOM_MAX, dtype=int32)])
+            self.prefix_max_bottom = concatenate([self.prefix_max_bottom, full(grow, -1, dtype=int32)])
+            self.suffix_min_bottom = concatenate([self.suffix_min_bottom, full(grow, BOTTOM_MAX, dtype=int32)])
+        self.bottom_low[n] = -1 if bottom is None else bottom
+        self.bottom_high[n] = BOTTOM_MAX if bottom is None else bottom
+        self.prefix_valid = min(self.prefix_valid, n - 1)
+        self.suffix_valid = max(self.suffix_valid, n + 1)
+        return self
+
+    def is_placed(self, n: int) -> bool:
+        """
+        Verifica si el bloque n esta en el espacio
+        """
+        return n < len(self.bottom_low) and self.bottom_low[n] >= 0
+
+    def prefix_max(self, n: int) -> int:
+        """
+        Maximo bottom entre los bloques con numero menor o igual a n (-1 si no hay)
+        """
+        n = min(n, len(self.prefix_max_bottom) - 1)
+        if n > self.prefix_valid:
+            start = self.prefix_valid + 1
+            self.prefix_max_bottom[start:n+1] = maximum(
+                maximum.accumulate(self.bottom_low[start:n+1]),
+                self.prefix_max_bottom[start-1] if start > 0 else -1,
+            )
+            self.prefix_valid = n
+        return int(self.prefix_max_bottom[n]) if n >= 0 else -1
+
+    def suffix_min(self, n: int) -> int:
+        """
+        Minimo bottom entre los bloques con numero mayor o igual a n (BOTTOM_MAX si no hay)
+        """
+        if n >= len(self.suffix_min_bottom):
+            return BOTTOM_MAX
+        if n < self.suffix_valid:
+            end = self.suffix_valid
+            self.suffix_min_bottom[n:end] = minimum(
+                minimum.accumulate(self.bottom_high[n:end][::-1])[::-1],
+                self.suffix_min_bottom[end] if end < len(self.suffix_min_bottom) else BOTTOM_MAX,
+            )
+            self.suffix_valid = n
+        return int(self.suffix_min_bottom[n])
+
+    def relocate_block(self, index: int, block: Block) -> "Space":
+        """
+        Reemplaza el bloque en la posicion index por el mismo bloque en otra
+        ubicacion (o rotado), actualizando la altura y el area ocupadas
+        """
+        old_block = self.blocks_in[index]
+        self.unindex_block(index)
+        self.remove_block_in_space(old_block)
+        self.untrack_block(old_block)
+        self.own('blocks_in')
+        self.blocks_in[index] = block
+        self.set_block_coords(index, block)
+        self.index_block(index)
+        self.add_block_in_space(block)
+        self.track_block(block)
+        self.set_height_ocupped()
+        self.set_area_not_ocupped()
+        return self
+
+    def relocate_blocks(self, moves: List[Tuple[int, Block]]) -> "Space":
+        """
+        Reemplaza a la vez varios bloques (index, bloque) por los mismos
+        bloques en otras ubicaciones. Se quitan todos antes de agregarlos
+        para que un bloque pueda ocupar el lugar que deja otro
+        """
+        self.own('blocks_in')
+        for index, block in moves:
+            self.unindex_block(index)
+            self.untrack_block(self.blocks_in[index])
+        old_blocks = [self.blocks_in[index] for index, _ in moves]
+        for index, block in moves:
+            self.set_block_coords(index, block)
+        for old_block in old_blocks:
+            self.remove_block_in_space(old_block)
+        for index, block in moves:
+            self.blocks_in[index] = block
+            self.index_block(index)
+            self.add_block_in_space(block)
+            self.track_block(block)
+        self.set_height_ocupped()
+        self.set_area_not_ocupped()
+        return self
+
+    def buckets(self, bottom: int, top: int) -> range:
+        """
+        Baldes del indice espacial que cubren las filas entre bottom y top
+        """
+        return range(bottom // self.bucket_height, top // self.bucket_height + 1)
+
+    def index_block(self, index: int) -> "Space":
+        """
+        Registra el bloque en la posicion index en el indice espacial
+        """
+        self.own('row_buckets')
+        for bucket in self.buckets(self.coords[index, BOTTOM], self.coords[index, TOP]):
+            self.row_buckets.setdefault(bucket, set()).add(index)
+        return self
+
+    def unindex_block(self, index: int) -> "Space":
+        """
+        Quita el bloque en la posicion index del indice espacial
+        """
+        self.own('row_buckets')
+        for bucket in self.buckets(self.coords[index, BOTTOM], self.coords[index, TOP]):
+            self.row_buckets[bucket].discard(index)
+        return self
+
+    def blocks_near(self, bottom: int, top: int) -> ndarray:
+        """
+        Devuelve las posiciones de los bloques cuyo tramo vertical puede
+        cruzar las filas entre bottom y top
+        """
+        near = set()
+        for bucket in self.buckets(bottom, top):
+            near.update(self.row_buckets.get(bucket, ()))
+        return fromiter(near, dtype=int32, count=len(near))
+
+    def bottom_range(self, n: int) -> Tuple[int, int]:
+        """
+        Rango (min, max) de bottom permitido para el bloque n segun el orden
+        de los bloques: un bloque de menor n no puede quedar sobre uno de mayor n
+        """
+        return max(self.prefix_max(n - 1), 0), self.suffix_min(n + 1)
+
+    def valid_positions(self, block: Block, lefts, bottoms, ignore: Tuple[int, ...] = ()) -> ndarray:
+        """
+        Verifica en lote si el bloque es valido en cada posicion candidata
+        (lefts[i], bottoms[i]) en una sola operacion vectorizada. Solo se
+        revisan los bloques del indice espacial que cruzan las filas candidatas.
+        Un escalar en bottoms se usa para todos los lefts. Los bloques con n
+        en ignore no cuentan como ocupados
+        """
+        lefts = atleast_1d(lefts)
+        bottoms = broadcast_to(atleast_1d(bottoms), lefts.shape)
+        low, high = self.bottom_range(block.n)
+        valid = (bottoms >= low) & (bottoms <= high)
+        near = self.blocks_near(int(bottoms.min()), int(bottoms.max()) + block.height - 1)
+        others = self.coords[near]
+        if ignore:
+            others = others[~isin(others[:, N], (block.n,) + tuple(ignore))]
+        else:
+            others = others[others[:, N] != block.n]
+        if len(others) == 0:
+            return valid
+        overlap = (
+            (lefts[:, None] <= others[:, RIGHT])
+            & (lefts[:, None] + block.width - 1 >= others[:, LEFT])
+            & (bottoms[:, None] <= others[:, TOP])
+            & (bottoms[:, None] + block.height - 1 >= others[:, BOTTOM])
+        )
+        return valid & ~overlap.any(axis=1)
+
+    def free_positions(self, block: Block, bottom_min: int, bottom_end: int) -> Tuple[ndarray, ndarray]:
+        """
+        Lista en una sola pasada vectorizada todas las posiciones (lefts, bottoms)
+        validas para el bloque con bottom_min <= bottom < bottom_end
+        """
+        xs = arange(self.width - block.width + 1)
+        ys = arange(bottom_min, max(bottom_end, bottom_min))
+        lefts = tile(xs, len(ys))
+        bottoms = repeat(ys, len(xs))
+        if len(lefts) == 0:
+            return lefts, bottoms
+        valid = self.valid_positions(block, lefts, bottoms)
+        return lefts[valid], bottoms[valid]
+
+    def lowest_position(
+        self,
+        block: Block,
+        bottom_min: int = 0,
+        bottom_max: int = BOTTOM_MAX,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Bottom-left-fill: calcula la posicion valida (left, bottom) mas baja y
+        luego mas a la izquierda con bottom_min <= bottom <= bottom_max,
+        considerando los huecos entre bloques. None si no hay ninguna
+        """
+        # sobre height_ocupped todas las filas estan libres
+        bottom_end = min(bottom_max, self.height_ocupped + 1) + 1
+        for start in range(bottom_min, bottom_end, self.bucket_height):
+            lefts, bottoms = self.free_positions(block, start, min(start + self.bucket_height, bottom_end))
+            if len(lefts) > 0:
+                logger.trace("Lowest position: {}", (lefts[0], bottoms[0]))
+                return int(lefts[0]), int(bottoms[0])
+        return None
+
+    def drop_position(self, index: int, slide_left: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Posicion (left, bottom) mas baja a la que puede caer el bloque index
+        respetando el orden de los bloques: en su columna o, con slide_left,
+        la mas baja y luego mas a la izquierda. None si no puede moverse
+        """
+        block = self.blocks_in[index]
+        low, _ = self.bottom_range(block.n)
+        if slide_left:
+            bottom_end = block.bottom + 1
+            for start in range(low, bottom_end, self.bucket_height):
+                lefts, bottoms = self.free_positions(block, start, min(start + self.bucket_height, bottom_end))
+                if len(lefts) > 0:
+                    position = int(lefts[0]), int(bottoms[0])
+                    return None if position == (block.left, block.bottom) else position
+            return None
+        if block.bottom <= low:
+            return None
+        bottoms = arange(low, block.bottom)
+        valid = self.valid_positions(block, full(len(bottoms), block.left), bottoms)
+        if not valid.any():
+            return None
+        return block.left, int(bottoms[valid.argmax()])
+
+    def compact(self, slide_left: bool = False, passes: int = 2) -> List[Tuple[int, Block]]:
+        """
+        Compactacion por gravedad: recorre los bloques por bottom (y por n)
+        y deja caer cada uno a su posicion mas baja (drop_position), hasta
+        passes pasadas mientras algun bloque se mueva. Devuelve los
+        movimientos (index, bloque) con la posicion final de cada bloque movido
+        """
+        moved = {}
+        for _ in range(passes):
+            placed = self.coords[:len(self.blocks_in)]
+            order = lexsort((placed[:, N], placed[:, BOTTOM]))
+            moved_in_pass = False
+            for index in order.tolist():
+                position = self.drop_position(index, slide_left)
+                if position is None:
+                    continue
+                block = self.blocks_in[index].copy()
+                block.localize(*position)
+                self.relocate_block(index, block)
+                moved[index] = block
+                moved_in_pass = True
+            if not moved_in_pass:
+                break
+        logger.trace("Compactacion: {} bloques movidos", len(moved))
+        return list(moved.items())
+
+    def is_valid_position(self, block: Block) -> bool:
+        """
+        Verifica si un bloque ya localizado es valido en el espacio
+        """
+        return bool(self.valid_positions(block, block.left, block.bottom)[0])
+
     def is_valid_block(self, block: Block) -> bool:
         """
-        Verifica si un bloque es valido
+        Verifica si un bloque es valido segun el orden de los bloques
+        """
+        low, high = self.bottom_range(block.n)
+        return low <= block.bottom <= high
+
+    def grid(self, num_rows: int):
+        """
+        Devuelve las primeras filas de la grilla de ocupacion
         """
-        for b in self.blocks_in:
-            if b.n <= block.n:
-                if b.bottom > block.bottom:
-                    return False
-            if b.n == block.n:
-                return True
-        return True
+        return self.space[:num_rows]
 
     def draw(self) -> None:
         """
@@ -133,9 +561,9 @@ class Space:
                 max_top = block.top
         
         print(f"max_top: {max_top}")
-        w = len(self.space[0])
-        h = len(self.space) - (len(self.space) - max_top - 2)
-        for i in reversed(self.space [:max_top+2]):
+        w = self.width
+        h = max_top + 2
+        for i in reversed(self.grid(max_top+2)):
             print(f"{h-1} {i}")
             h -= 1
             
@@ -148,4 +576,209 @@ class Space:
         return "Space({}, {})".format(
             self.width,
             self.height_ocupped
-        )
\ No newline at end of file
+        )
+
+
+class SummedAreaSpace(Space):
+    """
+    Espacio de trabajo con grilla de ocupacion y tabla de sumas acumuladas
+    (summed-area table) sobre ella, con la que saber si un rectangulo esta
+    libre cuesta O(1)
+    """
+    copy_on_write = Space.copy_on_write + ('sat',)
+
+    def init_space(self) -> "Space":
+        """
+        Inicializa la grilla de ocupacion y su tabla de sumas acumuladas.
+        sat[r, c] es la cantidad de celdas ocupadas en las filas [0, r) y
+        columnas [0, c), valida para r <= sat_valid
+        """
+        super().init_space()
+        self.sat = zeros((self.max_height + 1, self.width + 1), dtype=int32)
+        self.sat_valid = 0
+        return self
+
+    def add_block_in_space(self, block: Block) -> "Space":
+        """
+        Agrega un bloque a la grilla e invalida la tabla sobre su base
+        """
+        self.own('sat')
+        super().add_block_in_space(block)
+        self.sat_valid = min(self.sat_valid, block.bottom)
+        return self
+
+    def remove_block_in_space(self, block: Block) -> "Space":
+        """
+        Quita un bloque de la grilla e invalida la tabla sobre su base
+        """
+        self.own('sat')
+        super().remove_block_in_space(block)
+        self.sat_valid = min(self.sat_valid, block.bottom)
+        return self
+
+    def copy_structure(self, name: str):
+        """
+        Copia de una estructura del espacio, de la tabla solo las filas validas
+        """
+        if name == 'sat':
+            sat = zeros(self.sat.shape, dtype=self.sat.dtype)
+            sat[:self.sat_valid+1] = self.sat[:self.sat_valid+1]
+            return sat
+        return super().copy_structure(name)
+
+    def update_sat(self, num_rows: int) -> "Space":
+        """
+        Recalcula la tabla de sumas acumuladas hasta la fila num_rows
+        """
+        if num_rows > self.sat_valid:
+            start = self.sat_valid
+            occupied = (self.space[start:num_rows] != 0).astype(int32)
+            self.sat[start+1:num_rows+1, 1:] = self.sat[start, 1:] + occupied.cumsum(axis=1).cumsum(axis=0)
+            self.sat_valid = num_rows
+        return self
+
+    def is_free(self, lefts, bottoms, width: int, height: int) -> ndarray:
+        """
+        Verifica en O(1) por candidato si el rectangulo width x height con
+        esquina (lefts[i], bottoms[i]) esta libre
+        """
+        # sobre height_ocupped no hay bloques, basta la tabla hasta esa fila
+        num_rows = min(self.height_ocupped + 1, self.max_height)
+        self.update_sat(num_rows)
+        lefts = atleast_1d(lefts)
+        bottoms = broadcast_to(atleast_1d(bottoms), lefts.shape)
+        rows_lo = minimum(bottoms, num_rows)
+        rows_hi = minimum(bottoms + height, num_rows)
+        rights = lefts + width
+        occupied = (
+            self.sat[rows_hi, rights] - self.sat[rows_lo, rights]
+            - self.sat[rows_hi, lefts] + self.sat[rows_lo, lefts]
+        )
+        return occupied == 0
+
+    def valid_positions(self, block: Block, lefts, bottoms, ignore: Tuple[int, ...] = ()) -> ndarray:
+        """
+        Verifica en lote si el bloque es valido en cada posicion candidata
+        usando la tabla de sumas acumuladas. Si el bloque ya esta en el espacio
+        (reubicacion) o hay bloques a ignorar, sus celdas cuentan como
+        ocupadas en la tabla, por lo que se usa la revision contra los bloques
+        """
+        if ignore or self.is_placed(block.n):
+            return super().valid_positions(block, lefts, bottoms, ignore)
+        lefts = atleast_1d(lefts)
+        bottoms = broadcast_to(atleast_1d(bottoms), lefts.shape)
+        low, high = self.bottom_range(block.n)
+        return (bottoms >= low) & (bottoms <= high) & self.is_free(lefts, bottoms, block.width, block.height)
+
+    def __repr__(self) -> str:
+        return "SummedAreaSpace({}, {})".format(
+            self.width,
+            self.height_ocupped
+        )
+
+
+class SkylineSpace(Space):
+    """
+    Espacio de trabajo representado por un perfil de alturas (skyline).
+    En vez de una grilla densa guarda, por cada columna, la primera fila
+    libre sobre el bloque mas alto, por lo que la memoria depende solo del ancho
+    """
+    copy_on_write = Space.copy_on_write + ('skyline',)
+
+    def init_space(self) -> "Space":
+        """
+        Inicializa el perfil de alturas del espacio
+        """
+        self.space = None
+        self.skyline = zeros(self.width, dtype=int32)
+        return self
+
+    @property
+    def segments(self) -> List[Tuple[int, int, int]]:
+        """
+        Devuelve el skyline como lista de segmentos (left, width, height)
+        """
+        starts = [0] + [int(s) for s in flatnonzero(diff(self.skyline)) + 1]
+        ends = starts[1:] + [self.width]
+        return [(s, e - s, int(self.skyline[s])) for s, e in zip(starts, ends)]
+
+    def height_min_not_ocupped(self, block: Block) -> int:
+        """
+        Calcula la altura minima sobre el skyline donde puede apoyarse cierto bloque
+        """
+        return self.lowest_position(block)[1]
+
+    def lowest_position(
+        self,
+        block: Block,
+        bottom_min: int = 0,
+        bottom_max: int = BOTTOM_MAX,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Calcula la posicion (left, bottom) mas baja y a la izquierda donde
+        el bloque se apoya sobre el skyline, con bottom_min <= bottom <= bottom_max.
+        None si no hay ninguna
+        """
+        bottoms = maximum(sliding_window_view(self.skyline, block.width).max(axis=1), bottom_min)
+        left = int(bottoms.argmin())
+        if bottoms[left] > bottom_max:
+            return None
+        logger.trace("Lowest position: {}", (left, bottoms[left]))
+        return left, int(bottoms[left])
+
+    def add_block_in_space(self, block: Block) -> "Space":
+        """
+        Actualiza el skyline con un bloque
+        """
+        self.own('skyline')
+        columns = slice(block.left, block.right+1)
+        self.skyline[columns] = maximum(self.skyline[columns], block.top+1)
+        return self
+
+    def remove_block_in_space(self, block: Block) -> "Space":
+        """
+        Recalcula el skyline de las columnas del bloque sin considerarlo
+        """
+        self.own('skyline')
+        placed = self.coords[:len(self.blocks_in)]
+        placed = placed[
+            (placed[:, N] != block.n) & (placed[:, LEFT] <= block.right) & (placed[:, RIGHT] >= block.left)
+        ]
+        columns = arange(block.left, block.right+1)
+        cover = (placed[:, LEFT, None] <= columns) & (placed[:, RIGHT, None] >= columns)
+        self.skyline[columns] = where(cover, placed[:, TOP, None] + 1, 0).max(axis=0, initial=0)
+        return self
+
+    def grid(self, num_rows: int):
+        """
+        Reconstruye las primeras filas de la grilla de ocupacion a partir de los bloques
+        """
+        space = zeros((num_rows, self.width), dtype=self.dtype)
+        for block in self.blocks_in:
+            space[block.bottom:block.top+1, block.left:block.right+1] = block.n
+        return space
+
+    def __repr__(self) -> str:
+        return "SkylineSpace({}, {})".format(
+            self.width,
+            self.height_ocupped
+        )
+
+
+def new_space(
+    type_space: str,
+    width: int,
+    all_blocks: List[Block],
+    blocks_in: List[Block] = list(),
+) -> Space:
+    """
+    Construye el espacio de trabajo segun el tipo configurado
+    """
+    if type_space == "grid":
+        return Space(width=width, all_blocks=all_blocks, blocks_in=blocks_in)
+    elif type_space == "sat":
+        return SummedAreaSpace(width=width, all_blocks=all_blocks, blocks_in=blocks_in)
+    elif type_space == "skyline":
+        return SkylineSpace(width=width, all_blocks=all_blocks, blocks_in=blocks_in)
+    else:
+        raise ValueError("type_space debe ser 'grid', 'sat' o 'skyline'")
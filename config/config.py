@@ -42,6 +42,8 @@ class Config:
         self.type_algorithm = config['CoatingMod2D']['type_algorithm']
         self.space_width = config['CoatingMod2D']['space_width']
         self.num_blocks = config['CoatingMod2D']['num_blocks']
+        self.type_space = config['CoatingMod2D']['type_space']
+        self.type_encoding = config['CoatingMod2D']['type_encoding']
 
         # genetico
         if self.type_algorithm == 'genetic':
@@ -57,6 +59,13 @@ class Config:
         self.survivors = config['GeneticAlgorithm']['survivors']
         self.mutation_rate = config['GeneticAlgorithm']['mutation_rate']
         self.per_children_choose = config['GeneticAlgorithm']['per_children_choose']
+        self.num_islands = config['GeneticAlgorithm']['num_islands']
+        self.migration_interval = config['GeneticAlgorithm']['migration_interval']
+        self.num_migrants = config['GeneticAlgorithm']['num_migrants']
+        self.topology = config['GeneticAlgorithm']['topology']
+        self.cache_size = config['GeneticAlgorithm']['cache_size']
+        if self.type_algorithm == 'genetic':
+            self.compact_rate = config['GeneticAlgorithm']['compact_rate']
 
         # simulated_annealing
         if self.type_algorithm == 'simulated_annealing':
@@ -67,4 +76,10 @@ class Config:
         self.T_end = config['SimulatedAnnealing']['T_end']
         self.type_update = config['SimulatedAnnealing']['type_update']
         self.k = config['SimulatedAnnealing']['k']
+        self.num_chains = config['SimulatedAnnealing']['num_chains']
+        self.swap_interval = config['SimulatedAnnealing']['swap_interval']
+        self.temperature_ratio = config['SimulatedAnnealing']['temperature_ratio']
+        self.batch_size = config['SimulatedAnnealing']['batch_size']
+        if self.type_algorithm == 'simulated_annealing':
+            self.compact_rate = config['SimulatedAnnealing']['compact_rate']
 
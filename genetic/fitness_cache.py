@@ -0,0 +1,93 @@
+"""
+Cache de fitness de los genomas con expulsion LRU
+"""
+from typing import List
+from collections import OrderedDict
+from hashlib import blake2b
+
+from numpy import ndarray, zeros, int32, argsort, asarray
+
+from coating_mod_2d.block import Block
+from genetic.genome_store import GENE_N, GENE_LEFT, GENE_ROTATION
+
+
+class FitnessCache(object):
+    """
+    Fitness de los ultimos max_size genomas evaluados (None si no son
+    factibles). Con codificacion por posicion la clave es un hash canonico
+    del genoma: los bloques ordenados por n y el menor entre el layout y su
+    reflejo horizontal, que tiene la misma altura ocupada. Con codificacion
+    por permutacion es un hash de la permutacion y las rotaciones, que se
+    calcula antes de decodificar
+    """
+    def __init__(self, space_width: int, blocks: List[Block], max_size: int = 10000) -> None:
+        self.space_width = space_width
+        self.max_size = max_size
+        self.widths = zeros((max(block.n for block in blocks) + 1, 2), dtype=int32)
+        for block in blocks:
+            self.widths[block.n] = (block.width, block.height)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+
+    def key(self, genome: ndarray) -> bytes:
+        """
+        Hash canonico del genoma, igual para el genoma y su reflejo
+        """
+        genome = genome[argsort(genome[:, GENE_N], kind="stable")]
+        widths = self.widths[genome[:, GENE_N], genome[:, GENE_ROTATION]]
+        mirror = genome.copy()
+        mirror[:, GENE_LEFT] = self.space_width - genome[:, GENE_LEFT] - widths
+        canonical = min(genome.tobytes(), mirror.tobytes())
+        return blake2b(canonical, digest_size=16).digest()
+
+    def genotype_key(self, permutation: List[int], rotations: List[int]) -> bytes:
+        """
+        Hash de un genoma de permutacion
+        """
+        genotype = asarray(list(permutation) + list(rotations), dtype=int32)
+        return blake2b(genotype.tobytes(), digest_size=16).digest()
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: bytes) -> int:
+        """
+        Fitness guardado de la clave (lo marca como usado recientemente).
+        Cuenta un acierto o un fallo
+        """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def peek(self, key: bytes) -> int:
+        """
+        Fitness guardado de la clave, sin contar aciertos ni fallos
+        """
+        return self.entries.get(key)
+
+    def put(self, key: bytes, fitness: int) -> None:
+        """
+        Guarda el fitness de la clave y expulsa la usada hace mas tiempo si
+        se supera max_size
+        """
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __repr__(self) -> str:
+        return "FitnessCache({}/{}, aciertos={}, fallos={}, duplicados={})".format(
+            len(self.entries),
+            self.max_size,
+            self.hits,
+            self.misses,
+            self.duplicates,
+        )
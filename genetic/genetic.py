@@ -1,15 +1,108 @@
 """
 Clase del algoritmo genetico
 """
-from typing import List
+from typing import List, Tuple
 from copy import deepcopy
 from loguru import logger
 from time import perf_counter
+from random import seed, getrandbits
+from statistics import median
+from multiprocessing.pool import Pool
 
 from coating_mod_2d.block import Block
-from genetic.population import Population
+from genetic.population import Population, init_worker
 from genetic.individual import Individual
+from genetic.genome_store import GenomeStore
 
+# islas que viven en cada proceso de las islas, por numero de isla, y
+# cuantas generaciones de su historial ya se enviaron al proceso principal
+worker_islands = {}
+worker_reported = {}
+
+def new_islands(tasks: List[Tuple[int, dict, int]]) -> List[dict]:
+    """
+    Crea las islas (algoritmos geneticos seriales) (numero, parametros,
+    semilla) que viven en este proceso y devuelve su resumen inicial
+    """
+    reports = []
+    for island_id, config, task_seed in tasks:
+        seed(task_seed)
+        worker_islands[island_id] = Genetic(**config)
+        worker_reported[island_id] = 0
+        reports.append(island_report(island_id, 0))
+    return reports
+
+def evolve_islands_resident(task: Tuple[List[Tuple[int, List[Individual], int]], int, float, int]) -> List[dict]:
+    """
+    Recibe los inmigrantes de las islas (numero, inmigrantes, semilla) de
+    este proceso, las evoluciona generations generaciones y devuelve su
+    resumen con sus num_migrants mejores individuos como emigrantes
+    """
+    tasks, generations, start, num_migrants = task
+    reports = []
+    for island_id, immigrants, task_seed in tasks:
+        island = worker_islands[island_id]
+        if len(immigrants) > 0:
+            # con topologia full un emigrante puede llegar a varias islas del proceso
+            immigrants = [deepcopy(individual) for individual in immigrants]
+            island.population.replace(island.population.replacement_migrants(immigrants))
+        island.start = start
+        seed(task_seed)
+        island.evolve(generations)
+        reports.append(island_report(island_id, num_migrants))
+    return reports
+
+def island_report(island_id: int, num_migrants: int) -> dict:
+    """
+    Resumen de una isla para el proceso principal: las generaciones nuevas
+    de su historial, su mejor y peor individuo y sus emigrantes, todos solo
+    con su genoma
+    """
+    island = worker_islands[island_id]
+    reported = worker_reported[island_id]
+    worker_reported[island_id] = len(island.best_individuals)
+    population = island.population
+    return {
+        'generation': island.generation,
+        'num_individuals': population.num_individuals,
+        'best_individuals': island.best_individuals[reported:],
+        'worst_individuals': island.worst_individuals[reported:],
+        'average_fitnesses': island.average_fitnesses[reported:],
+        'median_fitnesses': island.median_fitnesses[reported:],
+        'best_individual': island.best_individual.release(),
+        'worst_individual': island.worst_individual.release(),
+        'emigrants': [
+            individual.release()
+            for individual in population.take(population.selection_elitist(num_choose=num_migrants))
+        ],
+    }
+
+class Island(object):
+    """
+    Resumen en el proceso principal de una isla que vive en un proceso de
+    las islas: historial de estadisticas, mejor y peor individuo y
+    emigrantes de la ultima epoca
+    """
+    def __init__(self, report: dict) -> None:
+        self.best_individuals = []
+        self.worst_individuals = []
+        self.average_fitnesses = []
+        self.median_fitnesses = []
+        self.update(report)
+
+    def update(self, report: dict) -> None:
+        """
+        Actualiza el resumen con el enviado por el proceso de la isla
+        """
+        self.generation = report['generation']
+        self.num_individuals = report['num_individuals']
+        self.best_individuals += report['best_individuals']
+        self.worst_individuals += report['worst_individuals']
+        self.average_fitnesses += report['average_fitnesses']
+        self.median_fitnesses += report['median_fitnesses']
+        self.best_individual = report['best_individual']
+        self.worst_individual = report['worst_individual']
+        self.emigrants = report['emigrants']
 
 class Genetic(object):
     def __init__(
@@ -28,27 +121,42 @@ class Genetic(object):
         generations: int = 100,
         compute_time: int = 60,
         n_jobs: int = 1,
+        type_space: str = "grid",
+        type_encoding: str = "position",
+        num_islands: int = 1,
+        migration_interval: int = 10,
+        num_migrants: int = 2,
+        topology: str = "ring",
+        cache_size: int = 10000,
+        compact_rate: float = 0.0,
     ) -> None:
+        """
+        Con n_jobs > 1 la poblacion vive en un almacen de genomas compartido
+        y los operadores se ejecutan en un pool de procesos.
+
+        Con num_islands > 1 se usa el modelo de islas: la poblacion se divide
+        en num_islands subpoblaciones que viven durante toda la ejecucion en
+        min(n_jobs, num_islands) procesos y cada migration_interval
+        generaciones envian sus num_migrants mejores individuos a sus vecinas
+        segun topology ("ring": a la siguiente, "full": a todas las demas).
+        Entre procesos solo viajan genomas: los emigrantes, el mejor y peor
+        individuo y el historial nuevo de cada isla
+
+        cache_size es el numero de genomas con fitness en cache (0 lo
+        desactiva), los hijos duplicados se descartan antes de evaluarlos.
+        compact_rate es la fraccion de hijos que se compacta por gravedad
+        despues de la mutacion
+        """
+        if topology not in ("ring", "full"):
+            raise ValueError("topology debe ser 'ring' o 'full'")
+        if num_islands < 1:
+            raise ValueError("num_islands debe ser mayor o igual a 1")
         self.space_width = space_width
         # self.area_factor = area_factor
         self.blocks = blocks
         self.n_jobs = n_jobs
-        self.population = Population(
-            space_width=space_width, 
-            # area_factor=area_factor,
-            blocks=deepcopy(blocks),
-            num_individuals=num_individuals,
-            n_jobs=n_jobs
-        )
-        self.time_computing = 0
-        self.best_individual = self.population.best_individual
-        self.worst_individual = self.population.worst_individual
-        self.average_fitness = self.population.average_fitness
-        self.median_fitness = self.population.median_fitness
-        self.best_individuals = [self.best_individual.fitness]
-        self.worst_individuals = [self.worst_individual.fitness]
-        self.average_fitnesses = [self.average_fitness]
-        self.median_fitnesses = [self.median_fitness]
+        self.type_space = type_space
+        self.type_encoding = type_encoding
 
         self.K = K
         self.per_child_choose = per_child_choose
@@ -63,14 +171,190 @@ class Genetic(object):
         self.start = perf_counter()
         self.generation = 0
 
+        self.num_islands = num_islands
+        self.migration_interval = migration_interval
+        self.num_migrants = num_migrants
+        self.topology = topology
+        self.cache_size = cache_size
+        self.compact_rate = compact_rate
+        self.islands: List[Island] = []
+        self.island_pools: List[Pool] = []
+        self.pool = None
+        self.store = None
+        self.time_computing = 0
+
+        size = num_individuals if population is None else len(population)
+        if num_islands > 1:
+            self.population = None
+            # un proceso por grupo de islas durante toda la ejecucion, cada
+            # isla vive siempre en el mismo proceso
+            self.island_pools = [Pool(processes=1) for _ in range(max(1, min(n_jobs, num_islands)))]
+            tasks = [(i, self.island_config(size // num_islands), getrandbits(32)) for i in range(num_islands)]
+            reports = self.map_islands(new_islands, tasks, lambda tasks: tasks)
+            self.islands = [Island(report) for report in reports]
+            self.aggregate_islands()
+        else:
+            if n_jobs > 1:
+                # almacen compartido con filas para la poblacion y para los hijos
+                self.store = GenomeStore(2 * size, len(blocks))
+                # pool de procesos para toda la ejecucion, se reutiliza en el juicio final
+                self.pool = Pool(
+                    processes=n_jobs,
+                    initializer=init_worker,
+                    initargs=(space_width, blocks, type_space, type_encoding, self.store),
+                )
+            self.population = Population(
+                space_width=space_width,
+                # area_factor=area_factor,
+                blocks=deepcopy(blocks),
+                num_individuals=num_individuals,
+                population=population,
+                n_jobs=n_jobs,
+                type_space=type_space,
+                type_encoding=type_encoding,
+                pool=self.pool,
+                store=self.store,
+                cache_size=cache_size,
+                compact_rate=compact_rate,
+            )
+            self.best_individual = self.population.best_individual
+            self.worst_individual = self.population.worst_individual
+            self.average_fitness = self.population.average_fitness
+            self.median_fitness = self.population.median_fitness
+            self.best_individuals = [self.best_individual.fitness]
+            self.worst_individuals = [self.worst_individual.fitness]
+            self.average_fitnesses = [self.average_fitness]
+            self.median_fitnesses = [self.median_fitness]
+
         self.start_info()
 
     def run(self) -> None:
+        try:
+            if self.num_islands > 1:
+                self.evolve_islands()
+            else:
+                self.evolve()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Cierra el pool de procesos y libera el almacen de genomas
+        """
+        for pool in ([self.pool] if self.pool is not None else []) + self.island_pools:
+            pool.close()
+            pool.join()
+        if self.store is not None:
+            self.store.close()
+
+    def island_config(self, num_individuals: int) -> dict:
+        """
+        Parametros de una isla: la misma configuracion en serie con una parte
+        de la poblacion
+        """
+        return {
+            'space_width': self.space_width,
+            'blocks': self.blocks,
+            'num_individuals': num_individuals,
+            'K': self.K,
+            'per_child_choose': self.per_child_choose,
+            'gen_to_final_judgment': self.gen_to_final_judgment,
+            'survivors': self.survivors,
+            'mutation_rate': self.mutation_rate,
+            'type_stop': self.type_stop,
+            'generations': self.generations,
+            'compute_time': self.compute_time,
+            'n_jobs': 1,
+            'type_space': self.type_space,
+            'type_encoding': self.type_encoding,
+            'cache_size': self.cache_size,
+            'compact_rate': self.compact_rate,
+        }
+
+    def evolve_islands(self) -> None:
+        """
+        Ciclo del modelo de islas: las islas evolucionan en paralelo
+        migration_interval generaciones y luego migran sus mejores
+        individuos, que cada isla recibe al empezar la siguiente epoca
+        """
+        immigrants = [[] for _ in self.islands]
         while self.stop(self.type_stop):
+            tasks = [(i, immigrants[i], getrandbits(32)) for i in range(self.num_islands)]
+            reports = self.map_islands(
+                evolve_islands_resident,
+                tasks,
+                lambda tasks: (tasks, self.migration_interval, self.start, self.num_migrants),
+            )
+            for island, report in zip(self.islands, reports):
+                island.update(report)
+            immigrants = self.migrate()
+            self.aggregate_islands()
+            self.generation = min(island.generation for island in self.islands)
+            self.time_computing = round(perf_counter() - self.start, 6)
+            self.info()
+
+    def map_islands(self, function, tasks: list, make_task) -> list:
+        """
+        Reparte las tareas de las islas (la isla i en el proceso i modulo el
+        numero de procesos), ejecuta function con make_task(tareas del
+        proceso) en cada uno y devuelve los resultados en el orden de las islas
+        """
+        num_pools = len(self.island_pools)
+        results = [
+            pool.apply_async(function, (make_task(tasks[p::num_pools]),))
+            for p, pool in enumerate(self.island_pools)
+        ]
+        reports = [None] * len(tasks)
+        for p, result in enumerate(results):
+            reports[p::num_pools] = result.get()
+        return reports
+
+    def migrate(self) -> List[List[Individual]]:
+        """
+        Inmigrantes de cada isla: los num_migrants mejores individuos de sus
+        vecinas segun la topologia, que reemplazan a sus peores
+        """
+        immigrants = []
+        for i in range(self.num_islands):
+            if self.topology == "ring":
+                sources = [(i - 1) % self.num_islands]
+            else:
+                sources = [j for j in range(self.num_islands) if j != i]
+            immigrants.append([individual for j in sources for individual in self.islands[j].emigrants])
+        logger.debug(f"Migracion entre {self.num_islands} islas ({self.topology})")
+        return immigrants
+
+    def aggregate_islands(self) -> None:
+        """
+        Estadisticas globales por generacion a partir de las de las islas.
+        La mediana es la mediana de las medianas de las islas
+        """
+        self.best_individuals = [min(values) for values in zip(*[island.best_individuals for island in self.islands])]
+        self.worst_individuals = [max(values) for values in zip(*[island.worst_individuals for island in self.islands])]
+        self.average_fitnesses = [
+            round(sum(values) / len(values), 9)
+            for values in zip(*[island.average_fitnesses for island in self.islands])
+        ]
+        self.median_fitnesses = [
+            int(median(values))
+            for values in zip(*[island.median_fitnesses for island in self.islands])
+        ]
+        self.best_individual = min((island.best_individual for island in self.islands), key=lambda individual: individual.fitness)
+        self.worst_individual = max((island.worst_individual for island in self.islands), key=lambda individual: individual.fitness)
+        self.average_fitness = self.average_fitnesses[-1]
+        self.median_fitness = self.median_fitnesses[-1]
+
+    def evolve(self, generations: int = None) -> None:
+        """
+        Ciclo de generaciones del algoritmo genetico, hasta la condicion de
+        parada o hasta completar generations generaciones
+        """
+        generation_end = None if generations is None else self.generation + generations
+        while self.stop(self.type_stop) and (generation_end is None or self.generation < generation_end):
             # Seleccion
             logger.debug(f"Seleccion")
             tic = perf_counter()
-            parents = self.population.selection_tournament(self.K, self.per_child_choose)
+            parents = self.population.take(self.population.selection_tournament(self.K, self.per_child_choose))
             toc = perf_counter()
             logger.debug(f"Seleccion: {round(toc - tic, 6)}")
 
@@ -88,6 +372,13 @@ class Genetic(object):
             toc = perf_counter()
             logger.debug(f"Mutacion: {round(toc - tic, 6)}")
 
+            # Evaluacion
+            logger.debug(f"Evaluacion")
+            tic = perf_counter()
+            children_mutated = self.population.evaluate(children_mutated)
+            toc = perf_counter()
+            logger.debug(f"Evaluacion: {round(toc - tic, 6)}")
+
             # Reemplazo
             logger.debug(f"Reemplazo")
             tic = perf_counter()
@@ -97,13 +388,7 @@ class Genetic(object):
                 self.same_best_individual = 0
             else:
                 next_generation = self.population.replacement_gap(children_mutated)
-            self.population = Population(
-                self.space_width,
-                # deepcopy(self.area_factor),
-                self.blocks,
-                population=next_generation,
-                n_jobs=self.n_jobs,
-            )
+            self.population.replace(next_generation)
             toc = perf_counter()
             logger.debug(f"Reemplazo: {round(toc - tic, 6)}")
 
@@ -155,7 +440,14 @@ class Genetic(object):
             logger.info(f"Generaciones: {self.generations}")
         elif self.type_stop == "compute_time":
             logger.info(f"Tiempo de computo: {self.compute_time}")
-        logger.info(f"Numero de individuos: {self.population.num_individuals}")
+        if self.num_islands > 1:
+            logger.info(f"Numero de islas: {self.num_islands}")
+            logger.info(f"Individuos por isla: {self.islands[0].num_individuals}")
+            logger.info(f"Topologia: {self.topology}")
+        else:
+            logger.info(f"Numero de individuos: {self.population.num_individuals}")
+        logger.info(f"Tipo de espacio: {self.type_space}")
+        logger.info(f"Tipo de codificacion: {self.type_encoding}")
 
     def info(self) -> None:
         """
@@ -166,4 +458,11 @@ class Genetic(object):
         logger.info(f"Peor individuo: {self.worst_individual.fitness}")
         logger.info(f"Fitness promedio: {self.average_fitness}")
         logger.info(f"Fitness mediana: {self.median_fitness}")
+        if self.population is not None:
+            logger.info(f"Fitness desviacion: {self.population.std_fitness}")
+            logger.info(f"Fitness cuartiles: {self.population.quartiles_fitness}")
+            logger.info(f"Fitness distintos: {self.population.distinct_fitness}")
+            cache = self.population.fitness_cache
+            if cache is not None:
+                logger.info(f"Cache de fitness: {cache.hits} aciertos, {cache.misses} fallos, {cache.duplicates} duplicados descartados")
         logger.info(f"Tiempo de computo: {perf_counter() - self.start}")
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Almacen de genomas de la poblacion en memoria compartida
+"""
+from typing import List
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing import resource_tracker
+
+from numpy import ndarray, dtype, zeros, int32, float64, nan
+
+from coating_mod_2d.block import Block, BlockSet, N, WIDTH, HEIGHT
+
+# campos de cada gen de un genoma
+GENE_N, GENE_LEFT, GENE_BOTTOM, GENE_ROTATION = range(4)
+NUM_FIELDS = 4
+
+
+def genome_from_blocks(blocks_in: List[Block], blocks: List[Block]) -> ndarray:
+    """
+    Genoma (bloque x [n, left, bottom, rotation]) de los bloques de un espacio,
+    la rotacion es respecto a las dimensiones originales en blocks
+    """
+    widths = {block.n: block.width for block in blocks}
+    genome = zeros((len(blocks_in), NUM_FIELDS), dtype=int32)
+    for row, block in enumerate(blocks_in):
+        genome[row] = (block.n, block.left, block.bottom, int(block.width != widths[block.n]))
+    return genome
+
+
+def dimensions_table(blocks: List[Block]) -> ndarray:
+    """
+    Dimensiones (width, height) originales de cada bloque indexadas por n
+    """
+    dimensions = zeros((max(block.n for block in blocks) + 1, 2), dtype=int32)
+    for block in blocks:
+        dimensions[block.n] = (block.width, block.height)
+    return dimensions
+
+
+def genome_dimensions(genome: ndarray, blocks: List[Block]) -> ndarray:
+    """
+    Dimensiones (width, height) de cada gen de un genoma, con su rotacion
+    """
+    dimensions = dimensions_table(blocks)[genome[:, GENE_N]]
+    rotated = genome[:, GENE_ROTATION] == 1
+    dimensions[rotated] = dimensions[rotated][:, ::-1]
+    return dimensions
+
+
+def blocks_from_genome(genome: ndarray, blocks: List[Block]) -> List[Block]:
+    """
+    Bloques localizados descritos por un genoma
+    """
+    dimensions = dimensions_table(blocks)
+    fenotype = BlockSet.empty(len(genome))
+    fenotype.data[:, N] = genome[:, GENE_N]
+    fenotype.data[:, [WIDTH, HEIGHT]] = dimensions[genome[:, GENE_N]]
+    fenotype.rotate(genome[:, GENE_ROTATION] == 1)
+    fenotype.localize(genome[:, GENE_LEFT], genome[:, GENE_BOTTOM])
+    return list(fenotype)
+
+
+class GenomeStore(object):
+    """
+    Genomas (individuo x bloque x campo) y fitness de una poblacion en un
+    unico bloque de memoria compartida, para que los procesos del pool lean y
+    escriban individuos por indice sin serializarlos. Con shared = False el
+    bloque es memoria privada del proceso (ejecucion sin pool)
+    """
+    def __init__(
+        self,
+        num_individuals: int,
+        num_blocks: int,
+        name: str = None,
+        shared: bool = True,
+    ) -> None:
+        self.num_individuals = num_individuals
+        self.num_blocks = num_blocks
+        genomes_size = num_individuals * num_blocks * NUM_FIELDS * dtype(int32).itemsize
+        size = genomes_size + num_individuals * dtype(float64).itemsize
+        self.owner = name is None
+        if not shared:
+            self.memory = None
+            buffer = bytearray(size)
+        elif self.owner:
+            self.memory = SharedMemory(create=True, size=size)
+            buffer = self.memory.buf
+        else:
+            self.memory = SharedMemory(name=name)
+            # solo el proceso que crea la memoria la libera
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+            buffer = self.memory.buf
+        self.genomes = ndarray(
+            (num_individuals, num_blocks, NUM_FIELDS), dtype=int32, buffer=buffer
+        )
+        self.fitness = ndarray(
+            (num_individuals,), dtype=float64, buffer=buffer, offset=genomes_size
+        )
+        if self.owner:
+            self.fitness[:] = nan
+
+    def write(self, index: int, genome: ndarray, fitness: float) -> "GenomeStore":
+        """
+        Escribe el genoma y fitness de un individuo en la fila index
+        """
+        self.genomes[index] = genome
+        self.fitness[index] = nan if fitness is None else fitness
+        return self
+
+    def read(self, index: int):
+        """
+        Devuelve una copia del genoma y el fitness de la fila index
+        """
+        return self.genomes[index].copy(), self.fitness[index]
+
+    def close(self) -> None:
+        """
+        Libera la memoria compartida (y la elimina si este proceso la creo)
+        """
+        del self.genomes
+        del self.fitness
+        if self.memory is None:
+            return
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __getstate__(self) -> dict:
+        return {
+            'name': self.memory.name,
+            'num_individuals': self.num_individuals,
+            'num_blocks': self.num_blocks,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['num_individuals'], state['num_blocks'], name=state['name'])
+
+    def __repr__(self) -> str:
+        return "GenomeStore({}, {}, {})".format(
+            "privado" if self.memory is None else self.memory.name,
+            self.num_individuals,
+            self.num_blocks,
+        )
@@ -2,36 +2,160 @@
 Clase de individuo
 """
 from copy import deepcopy
-from typing import List
+from typing import List, Tuple
 from loguru import logger
-from random import random, randint, shuffle
+from random import random, randint, shuffle, choice
+from numpy import ndarray, zeros, int32, int64, argsort, isnan, unique
 
 from coating_mod_2d.block import Block
-from coating_mod_2d.space import Space
+from coating_mod_2d.space import Space, new_space, BOTTOM_MAX, LEFT, RIGHT, BOTTOM, TOP
+from coating_mod_2d.permutation import decode, random_genome, order_crossover, uniform_crossover, mutate_genome
+from genetic.genome_store import (
+    GENE_N, GENE_LEFT, GENE_BOTTOM, GENE_ROTATION, genome_from_blocks, blocks_from_genome, genome_dimensions,
+)
 
 class Individual:
+    __slots__ = (
+        '_space',
+        'space_width',
+        'blocks',
+        'type_space',
+        'type_encoding',
+        'feasible',
+        'genome',
+        'index',
+        'fitness',
+        'permutation',
+        'rotations',
+    )
+
     def __init__(
         self, 
         space_width: int,
         # area_factor: float,
         blocks: List[Block] = None, 
-        fenotype: List[Block] = None, 
+        type_space: str = "grid",
+        type_encoding: str = "position",
+        permutation: List[int] = None,
+        rotations: List[int] = None,
     ) -> None:
         """
-        Clase de individuo
+        Clase de individuo. Con type_encoding = "permutation" el genoma es
+        una permutacion de los bloques con un bit de rotacion por bloque y
+        el fenotipo se obtiene decodificandolo sobre blocks.
+
+        El individuo puede guardar solo su genoma compacto y su fitness
+        (release), el espacio se reconstruye desde el genoma cuando se necesita
         """
         # self.area_factor = area_factor
-        if blocks:
-            self.space = Space(width=space_width, all_blocks=deepcopy(blocks))
-            self.genes = self.generate_individual(deepcopy(blocks))
-        if fenotype:
-            self.space = Space(width=space_width, all_blocks=deepcopy(fenotype))
-            for block in fenotype:
-                self.space.add_block(block)
-            self.genes = self.get_genotype()
-        self.fitness = self.get_fitness()
+        self._space = None
+        self.space_width = space_width
+        self.blocks = blocks
+        self.type_space = type_space
+        self.type_encoding = type_encoding
+        self.feasible = True
+        # genoma compacto y fila del almacen compartido donde esta guardado
+        self.genome = None
+        self.index = None
+        if type_encoding == "permutation":
+            if permutation is None:
+                permutation, rotations = random_genome(blocks)
+                if not self.set_genome(space_width, permutation, rotations):
+                    # el orden de los n siempre tiene decodificacion valida
+                    self.set_genome(space_width, sorted(permutation), rotations)
+            else:
+                self.feasible = self.set_genome(space_width, permutation, rotations)
+        else:
+            if blocks:
+                self.space = new_space(type_space, width=space_width, all_blocks=deepcopy(blocks))
+                self.generate_individual(deepcopy(blocks))
+        self.fitness = self.get_fitness() if self.feasible else None
         # self.draw()
 
+    @classmethod
+    def from_genome(
+        cls,
+        space_width: int,
+        blocks: List[Block],
+        genome: ndarray,
+        fitness: int,
+        type_space: str = "grid",
+        type_encoding: str = "position",
+        index: int = None,
+    ) -> "Individual":
+        """
+        Construye un individuo solo con su genoma y fitness (None o nan si
+        aun no se evalua), el espacio se construye desde el genoma la primera
+        vez que se necesita
+        """
+        individual = cls.__new__(cls)
+        individual._space = None
+        individual.space_width = space_width
+        individual.blocks = blocks
+        individual.type_space = type_space
+        individual.type_encoding = type_encoding
+        individual.feasible = True
+        individual.genome = genome
+        individual.index = index
+        individual.fitness = None if fitness is None or isnan(fitness) else int(fitness)
+        if type_encoding == "permutation":
+            individual.permutation = genome[:, GENE_N].tolist()
+            individual.rotations = [0] * len(blocks)
+            for n, rotation in genome[:, [GENE_N, GENE_ROTATION]].tolist():
+                individual.rotations[n-1] = rotation
+        return individual
+
+    @property
+    def space(self) -> Space:
+        """
+        Espacio con el fenotipo del individuo
+        """
+        if self._space is None:
+            self._space = new_space(self.type_space, width=self.space_width, all_blocks=self.blocks)
+            for block in blocks_from_genome(self.genome, self.blocks):
+                self._space.add_block(block)
+        return self._space
+
+    @space.setter
+    def space(self, space: Space) -> None:
+        self._space = space
+
+    @property
+    def genes(self) -> List[int]:
+        """
+        Genotipo [n, left, bottom, ...] del individuo
+        """
+        return self.to_genome()[:, :3].ravel().tolist()
+
+    def release(self) -> "Individual":
+        """
+        Libera el espacio del individuo y deja solo el genoma compacto
+        """
+        self.to_genome()
+        self._space = None
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "Individual":
+        """
+        Copia del individuo que comparte el genoma (no se modifica en su
+        lugar) y toma un snapshot copy-on-write del espacio
+        """
+        individual = Individual.__new__(Individual)
+        for name in self.__slots__:
+            if hasattr(self, name):
+                setattr(individual, name, getattr(self, name))
+        if self._space is not None:
+            individual._space = self._space.snapshot()
+        return individual
+
+    def to_genome(self) -> ndarray:
+        """
+        Devuelve el genoma compacto (bloque x [n, left, bottom, rotation]) del individuo
+        """
+        if self.genome is None:
+            self.genome = genome_from_blocks(self.space.blocks_in, self.blocks)
+        return self.genome
+
     def generate_individual(self, blocks: List[Block]) -> None:
         """
         Genera un individuo
@@ -41,34 +165,35 @@ class Individual:
             if random() < 0.5:
                 blockp.rotate()
             # min_height = self.space.height_min_not_ocupped(block)
-            assign = False
-            ys = [y for y in range(self.space.height_ocupped + 10)]
-            shuffle(ys)
-            for bottom in ys:
-                xs = [x for x in range(self.space.width - blockp.width + 1)]
-                shuffle(xs)
-                for left in xs:
-                    blockp.localize(left, bottom)
-                    assign = self.is_valid_block(blockp)
-                    # logger.info(f"height_ocupped: {self.space.height_ocupped} left: {left} bottom: {bottom}")
-                    # logger.info(f"assig: {assign} blockp {blockp}")
-                    if assign:
-                        self.space.add_block(blockp)
-                        break
-                if assign:
-                    break
+            low, high = self.space.bottom_range(blockp.n)
+            lefts, bottoms = self.space.free_positions(blockp, low, min(self.space.height_ocupped + 10, high + 1))
+            if len(bottoms) > 0:
+                bottom = choice(unique(bottoms).tolist())
+                left = choice(lefts[bottoms == bottom].tolist())
+                blockp.localize(left, bottom)
+                self.space.add_block(blockp)
         return self.get_genotype()
 
+    def set_genome(self, space_width: int, permutation: List[int], rotations: List[int]) -> bool:
+        """
+        Decodifica un genoma de permutacion en un espacio nuevo y lo asigna
+        al individuo si es valido
+        """
+        space = new_space(self.type_space, width=space_width, all_blocks=self.blocks)
+        if not decode(space, self.blocks, permutation, rotations):
+            return False
+        self.space = space
+        self.permutation = permutation
+        self.rotations = rotations
+        self.genome = None
+        self.index = None
+        return True
+
     def is_valid_block(self, block: Block) -> bool:
         """
         Valida el bloque en el espacio
         """
-        for block_in_space in self.space.blocks_in:
-            if block_in_space.n != block.n:
-                # logger.info(f"inter {block.intersection(block_in_space)} valid bot {self.space.is_valid_block(block)}")
-                if block.intersection(block_in_space) or not self.space.is_valid_block(block):
-                    return False
-        return True
+        return self.space.is_valid_position(block)
 
     def validate(self) -> bool:
         """
@@ -84,7 +209,7 @@ class Individual:
         Devuelve el genotipo del individuo
         """
         genotype = []
-        for block in deepcopy(self.space.blocks_in):
+        for block in self.space.blocks_in:
             genotype.append(block.n)
             genotype.append(block.left)
             genotype.append(block.bottom)
@@ -118,69 +243,175 @@ class Individual:
 
     def crossover(self, partner: "Individual") -> "Individual":
         """
-        Cruza dos individuos
+        Cruza dos individuos. Las posiciones y dimensiones de los bloques de
+        los padres se leen de sus genomas, sin construir sus espacios, y el
+        hijo es solo un genoma factible por construccion, sin evaluar
         """
-        num_genes = int(len(self.genes)/3)
+        if self.type_encoding == "permutation":
+            return self.crossover_permutation(partner)
+        genome = self.to_genome()
+        partner_genome = partner.to_genome()
+        dimensions = genome_dimensions(genome, self.blocks)
+        partner_dimensions = genome_dimensions(partner_genome, partner.blocks)
+        genes = genome[:, :3].ravel().tolist()
+        partner_genes = partner_genome[:, :3].ravel().tolist()
+        num_genes = int(len(genes)/3)
         midpoints = [m for m in range(1, num_genes - 2)]
         shuffle(midpoints)
         midpoint = midpoints[0]
-        blocks_child = []
+        genome_child = zeros((num_genes, 4), dtype=int32)
+        # ocupacion del hijo parcial: columnas y filas de cada bloque colocado
+        occupied = zeros((num_genes, TOP + 1), dtype=int64)
         for n in range(num_genes):
             if n > midpoint:
-                num_block = self.genes[n*3]
-                left = self.genes[n*3 + 1]
-                floor = 0
-                while True:
-                    if diff_height < 0:
-                        bottom = self.genes[n*3 + 2] + abs(diff_height) + floor
-                    else:
-                        bottom = self.genes[n*3 + 2] - diff_height + floor
-                    block = Block(num_block, self.space.blocks_in[n].width, self.space.blocks_in[n].height)
-                    block.localize(left, bottom)
-                    if not any([block.intersection(block_child) or block.bottom < block_child.bottom for block_child in blocks_child]):
-                        blocks_child.append(block)
-                        break
-                    else:
-                        floor += 1
+                num_block = genes[n*3]
+                left = genes[n*3 + 1]
+                if diff_height < 0:
+                    bottom = genes[n*3 + 2] + abs(diff_height)
+                else:
+                    bottom = genes[n*3 + 2] - diff_height
+                width, height = dimensions[n].tolist()
+                bottom = self.lowest_bottom(occupied[:n], left, left + width - 1, height, bottom)
+                rotation = genome[n, GENE_ROTATION]
             else:
-                num_block = partner.genes[n*3]
-                left = partner.genes[n*3 + 1]
-                bottom = partner.genes[n*3 + 2]
-                height_mid = partner.space.blocks_in[n].bottom
-                bottom_block = self.space.blocks_in[n+1].bottom
+                num_block = partner_genes[n*3]
+                left = partner_genes[n*3 + 1]
+                bottom = partner_genes[n*3 + 2]
+                height_mid = bottom
+                bottom_block = int(genome[n+1, GENE_BOTTOM])
                 diff_height = height_mid - bottom_block
-                block = Block(num_block, self.space.blocks_in[n].width, self.space.blocks_in[n].height)
-                block.localize(left, bottom)
-                blocks_child.append(block)
-        # child = Individual(space_width=self.space.width, fenotype=deepcopy(blocks_child), area_factor=self.area_factor)
-        child = Individual(space_width=self.space.width, fenotype=deepcopy(blocks_child))
-        return child
+                width, height = partner_dimensions[n].tolist()
+                rotation = partner_genome[n, GENE_ROTATION]
+            genome_child[n] = (num_block, left, bottom, rotation)
+            occupied[n, [LEFT, RIGHT, BOTTOM, TOP]] = (left, left + width - 1, bottom, bottom + height - 1)
+        return Individual.from_genome(
+            self.space_width,
+            self.blocks,
+            genome_child,
+            None,
+            type_space=self.type_space,
+            type_encoding=self.type_encoding,
+        )
+
+    @staticmethod
+    def lowest_bottom(occupied: ndarray, left: int, right: int, height: int, floor: int) -> int:
+        """
+        Bottom mas bajo desde floor para un bloque en las columnas
+        [left, right] sin solaparse con los bloques ocupados (LEFT, RIGHT,
+        BOTTOM y TOP como en Space) ni quedar bajo ninguno de ellos
+        """
+        if len(occupied) == 0:
+            return floor
+        bottom = max(floor, int(occupied[:, BOTTOM].max()))
+        columns = occupied[(occupied[:, LEFT] <= right) & (occupied[:, RIGHT] >= left)]
+        starts = columns[:, BOTTOM] - height + 1
+        ends = columns[:, TOP]
+        for i in argsort(starts, kind="stable").tolist():
+            if starts[i] > bottom:
+                break
+            bottom = max(bottom, int(ends[i]) + 1)
+        return bottom
+
+    def crossover_permutation(self, partner: "Individual") -> "Individual":
+        """
+        Cruza dos individuos con genoma de permutacion y decodifica el hijo.
+        None si el hijo no es valido
+        """
+        permutation, rotations = self.crossover_genotype(partner)
+        child = Individual(
+            space_width=self.space_width,
+            blocks=self.blocks,
+            type_space=self.type_space,
+            type_encoding=self.type_encoding,
+            permutation=permutation,
+            rotations=rotations,
+        )
+        return child if child.feasible else None
+
+    def crossover_genotype(self, partner: "Individual") -> Tuple[List[int], List[int]]:
+        """
+        Genoma (permutacion, rotaciones) del hijo de dos individuos con genoma
+        de permutacion, sin decodificarlo: OX sobre la permutacion y cruce
+        uniforme sobre las rotaciones
+        """
+        return (
+            order_crossover(self.permutation, partner.permutation),
+            uniform_crossover(self.rotations, partner.rotations),
+        )
 
     def mutate(self, mutation_rate: float, tryings: int = 10) -> bool:
         """
-        Mutacion de un individuo
+        Mutacion de un individuo. Con codificacion por posicion se valida y
+        aplica sobre el genoma, sin construir el espacio, y el individuo
+        queda sin evaluar
         """
+        if self.type_encoding == "permutation":
+            return self.mutate_permutation(mutation_rate, tryings)
         mutated = random() < mutation_rate
         if mutated:
+            genome = self.to_genome()
+            dimensions = genome_dimensions(genome, self.blocks)
+            bottoms = genome[:, GENE_BOTTOM]
+            tops = bottoms + dimensions[:, 1] - 1
             for t in range(tryings):
-                num_genes = int(len(self.genes)/3)
+                num_genes = len(genome)
                 num_block = randint(0, num_genes - 1)
-                pivot_genes = deepcopy(self.genes)
-                pivot_genes[num_block*3 + 1] = randint(0, self.space.width - self.space.blocks_in[num_block].width)
-                pivot_genes[num_block*3 + 2] = randint(0, self.space.height_ocupped)
-                pivot_block = deepcopy(self.space.blocks_in[num_block])
-                pivot_block.localize(pivot_genes[num_block*3 + 1], pivot_genes[num_block*3 + 2])
-                if not self.is_valid_block(pivot_block):
+                n = genome[num_block, GENE_N]
+                width, height = dimensions[num_block].tolist()
+                left = randint(0, self.space_width - width)
+                low = max(int(bottoms[genome[:, GENE_N] < n].max(initial=-1)), 0)
+                high = int(bottoms[genome[:, GENE_N] > n].min(initial=BOTTOM_MAX))
+                bottom = randint(low, min(high, int(tops.max(initial=0))))
+                lefts = genome[:, GENE_LEFT]
+                overlap = (
+                    (lefts <= left + width - 1) & (lefts + dimensions[:, 0] - 1 >= left)
+                    & (bottoms <= bottom + height - 1) & (tops >= bottom)
+                )
+                overlap[num_block] = False
+                if overlap.any():
                     return False
                 else:
-                    logger.trace(f"Mutacion en el individuo {len(self.space.blocks_in)}")
-                    self.genes[num_block*3 + 1] = pivot_genes[num_block*3 + 1]
-                    self.genes[num_block*3 + 2] = pivot_genes[num_block*3 + 2]
-                    self.space.blocks_in[num_block].localize(self.genes[num_block*3 + 1], self.genes[num_block*3 + 2])
+                    logger.trace(f"Mutacion en el individuo {num_genes}")
+                    genome = genome.copy()
+                    genome[num_block, GENE_LEFT] = left
+                    genome[num_block, GENE_BOTTOM] = bottom
+                    self.genome = genome
+                    self._space = None
+                    self.fitness = None
+                    self.index = None
                     return True
         else:
             return False
 
+    def compact(self, slide_left: bool = True) -> bool:
+        """
+        Compactacion por gravedad del fenotipo (Space.compact). Solo con
+        codificacion por posicion, la decodificacion de una permutacion ya
+        deja cada bloque en su posicion mas baja
+        """
+        if self.type_encoding == "permutation":
+            return False
+        if len(self.space.compact(slide_left)) == 0:
+            return False
+        self.fitness = self.get_fitness()
+        self.genome = None
+        self.index = None
+        return True
+
+    def mutate_permutation(self, mutation_rate: float, tryings: int = 10) -> bool:
+        """
+        Mutacion de un individuo con genoma de permutacion (swap, insert o
+        rotate-flip), se reintenta mientras la decodificacion no sea valida
+        """
+        if random() >= mutation_rate:
+            return False
+        for t in range(tryings):
+            permutation, rotations = mutate_genome(self.permutation, self.rotations)
+            if self.set_genome(self.space_width, permutation, rotations):
+                self.fitness = self.get_fitness()
+                return True
+        return False
+
     def draw(self) -> None:
         """
         Dibuja el individuo
@@ -1,15 +1,160 @@
 """
 Clase de la poblacion o conjunto de individuos
 """
-from typing import List, Tuple
+from typing import List, Tuple, Iterator
 from copy import deepcopy
-from random import random, shuffle
-from multiprocessing import Process, Lock, Queue
+from itertools import islice
+from random import random, shuffle, seed, getrandbits, randrange, getstate, setstate
+from multiprocessing.pool import Pool
 
 from loguru import logger
+from numpy import ndarray, array, float64, arange, concatenate, argpartition, argsort, log, partition, unique, take_along_axis
+from numpy.random import default_rng
 
 from coating_mod_2d.block import Block
 from genetic.individual import Individual
+from genetic.genome_store import GenomeStore
+from genetic.population_tensor import PopulationTensor
+from genetic.fitness_cache import FitnessCache
+
+# configuracion del problema en cada proceso del pool, se carga una sola vez
+worker_config = {}
+
+def init_worker(
+    space_width: int,
+    blocks: List[Block],
+    type_space: str,
+    type_encoding: str,
+    store: GenomeStore,
+) -> None:
+    """
+    Inicializa un proceso del pool con la configuracion del problema y el
+    almacen de genomas compartido
+    """
+    worker_config['space_width'] = space_width
+    worker_config['blocks'] = blocks
+    worker_config['type_space'] = type_space
+    worker_config['type_encoding'] = type_encoding
+    worker_config['store'] = store
+
+def load_individual(row: int) -> Individual:
+    """
+    Individuo de la fila row del almacen compartido
+    """
+    genome, fitness = worker_config['store'].read(row)
+    return Individual.from_genome(
+        worker_config['space_width'],
+        worker_config['blocks'],
+        genome,
+        fitness,
+        type_space=worker_config['type_space'],
+        type_encoding=worker_config['type_encoding'],
+        index=row,
+    )
+
+def store_individual(row: int, individual: Individual) -> None:
+    """
+    Escribe el genoma y el fitness de un individuo en la fila row del almacen
+    """
+    worker_config['store'].write(row, individual.to_genome(), individual.fitness)
+
+def generate_into(task: List[Tuple[int, int]]) -> List[int]:
+    """
+    Genera en un proceso del pool individuos (semilla, fila) en el almacen,
+    con una semilla por individuo para que la poblacion sea reproducible
+    """
+    rows = []
+    for individual_seed, row in task:
+        seed(individual_seed)
+        individual = Individual(
+            worker_config['space_width'],
+            blocks=worker_config['blocks'],
+            type_space=worker_config['type_space'],
+            type_encoding=worker_config['type_encoding'],
+        )
+        store_individual(row, individual)
+        rows.append(row)
+    return rows
+
+def crossover_into(task: List[Tuple[int, int, int, int]]) -> List[int]:
+    """
+    Cruza en un proceso del pool los padres (fila_i, fila_j) del almacen y
+    escribe cada hijo en su fila. Cada cruce trae su semilla, asi el hijo no
+    depende de como se reparten los cruces entre procesos. Devuelve las filas
+    con hijo valido
+    """
+    parents = {}
+    produced = []
+    for cross_seed, row_i, row_j, row_child in task:
+        for row in (row_i, row_j):
+            if row not in parents:
+                parents[row] = load_individual(row)
+        seed(cross_seed)
+        child = parents[row_i].crossover(parents[row_j])
+        if child is not None:
+            store_individual(row_child, child)
+            produced.append(row_child)
+    return produced
+
+def decode_into(task: List[Tuple[int, List[int], List[int]]]) -> List[Tuple[int, int]]:
+    """
+    Decodifica en un proceso del pool los genomas de permutacion (fila,
+    permutacion, rotaciones) de los hijos y escribe los validos en su fila.
+    Devuelve (fila, fitness) de cada hijo, con fitness None si no es valido
+    """
+    decoded = []
+    for row, permutation, rotations in task:
+        child = Individual(
+            worker_config['space_width'],
+            blocks=worker_config['blocks'],
+            type_space=worker_config['type_space'],
+            type_encoding=worker_config['type_encoding'],
+            permutation=permutation,
+            rotations=rotations,
+        )
+        if child.feasible:
+            store_individual(row, child)
+        decoded.append((row, child.fitness))
+    return decoded
+
+def mutate_into(task: Tuple[List[Tuple[int, int]], float, float]) -> List[int]:
+    """
+    Muta en un proceso del pool los individuos (semilla, fila) del almacen y
+    compacta por gravedad una fraccion compact_rate. Devuelve las filas que
+    cambiaron
+    """
+    rows, mutation_rate, compact_rate = task
+    mutated = []
+    for mutation_seed, row in rows:
+        seed(mutation_seed)
+        individual = load_individual(row)
+        changed = individual.mutate(mutation_rate=mutation_rate)
+        if compact_rate > 0 and random() < compact_rate:
+            changed = individual.compact() or changed
+        if changed:
+            store_individual(row, individual)
+            mutated.append(row)
+    return mutated
+
+def sample_pairs(num_parents: int) -> Iterator[Tuple[int, int]]:
+    """
+    Parejas (i, j) distintas con i != j en orden aleatorio, sorteadas a
+    medida que se piden sin construir todas las parejas. Cuando quedan pocas
+    sin sortear se enumeran las restantes y se desordenan
+    """
+    total = num_parents * (num_parents - 1)
+    drawn = set()
+    while len(drawn) < total // 2:
+        i = randrange(num_parents)
+        j = randrange(num_parents - 1)
+        if j >= i:
+            j += 1
+        if (i, j) not in drawn:
+            drawn.add((i, j))
+            yield i, j
+    rest = [(i, j) for i in range(num_parents) for j in range(num_parents) if i != j and (i, j) not in drawn]
+    shuffle(rest)
+    yield from rest
 
 class Population(object):
     def __init__(
@@ -20,62 +165,238 @@ class Population(object):
         num_individuals: int = None,
         population: List[Individual] = None,
         n_jobs: int = 1,
+        type_space: str = "grid",
+        type_encoding: str = "position",
+        pool: Pool = None,
+        store: GenomeStore = None,
+        cache_size: int = 10000,
+        compact_rate: float = 0.0,
     ) -> None:
+        """
+        Los individuos se generan, cruzan y mutan con las funciones de los
+        procesos del pool sobre el almacen de genomas: con pool en sus
+        procesos sobre el almacen compartido store y sin pool en este
+        proceso sobre un almacen privado. Cada tarea trae su semilla, asi los
+        resultados son los mismos con cualquier n_jobs.
+
+        La poblacion usa dos buffers (actual y siguiente) de num_individuals
+        individuos, en el almacen las filas [0, num_individuals) y
+        [num_individuals, 2 * num_individuals). Los hijos se escriben en el
+        buffer siguiente y replace escribe ahi la nueva generacion por indice
+        e intercambia los buffers.
+
+        Los fitness de los genomas evaluados se guardan en un cache LRU de
+        cache_size genomas (0 lo desactiva).
+
+        En la mutacion una fraccion compact_rate de los hijos se compacta por
+        gravedad como paso de busqueda local
+        """
         self.space_width = space_width
         # self.area_factor = area_factor
         self.blocks = deepcopy(blocks)
         self.n_jobs = n_jobs
-        self.lock = Lock()
+        self.type_space = type_space
+        self.type_encoding = type_encoding
+        self.pool = pool
+        if store is None:
+            size = num_individuals if population is None else len(population)
+            store = GenomeStore(2 * size, len(self.blocks), shared=False)
+        self.store = store
+        self.compact_rate = compact_rate
+        self.fitness_cache = FitnessCache(space_width, self.blocks, cache_size) if cache_size > 0 else None
+        self.buffer = 0
         if population is None:
             self.num_individuals = num_individuals
             self.population = self.generate_population(num_individuals)
         else:
             self.num_individuals = len(population)
-            self.population = population
+            self.population = list(population)
+            self.store_population()
+        self.buffers = [self.population, [None] * self.num_individuals]
+
+    def run_tasks(self, function, tasks: list, unordered: bool = False) -> Iterator:
+        """
+        Resultados de function sobre cada tarea, en los procesos del pool o,
+        sin pool, en este proceso con la misma configuracion que los procesos
+        del pool. Las semillas de las tareas no alteran el generador de
+        numeros aleatorios de este proceso
+        """
+        if self.pool is not None:
+            yield from (self.pool.imap_unordered if unordered else self.pool.imap)(function, tasks)
+            return
+        for task in tasks:
+            init_worker(self.space_width, self.blocks, self.type_space, self.type_encoding, self.store)
+            state = getstate()
+            result = function(task)
+            setstate(state)
+            yield result
+
+    def chunks(self, items: list) -> List[list]:
+        """
+        Reparte items en bloques para las tareas del pool
+        """
+        chunk_size = max(1, len(items) // (max(1, self.n_jobs) * 4))
+        return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+    def load_individual(self, row: int) -> Individual:
+        """
+        Individuo (solo genoma) de la fila row del almacen
+        """
+        genome, fitness = self.store.read(row)
+        return Individual.from_genome(
+            self.space_width,
+            self.blocks,
+            genome,
+            fitness,
+            type_space=self.type_space,
+            type_encoding=self.type_encoding,
+            index=row,
+        )
+
+    @property
+    def first_row(self) -> int:
+        """
+        Primera fila del almacen del buffer actual
+        """
+        return self.buffer * self.num_individuals
+
+    @property
+    def next_first_row(self) -> int:
+        """
+        Primera fila del almacen del buffer siguiente
+        """
+        return (1 - self.buffer) * self.num_individuals
+
+    def store_population(self, population: List[Individual] = None, first_row: int = None) -> None:
+        """
+        Escribe los genomas de la poblacion en filas consecutivas del almacen
+        desde first_row (por defecto el buffer actual). Los que ya estan en el
+        almacen se copian por indice, leyendo todas las filas de origen antes
+        de escribir
+        """
+        if population is None:
+            population = self.population
+        if first_row is None:
+            first_row = self.first_row
+        stored = [k for k, individual in enumerate(population) if individual.index is not None]
+        sources = [population[k].index for k in stored]
+        rows = [first_row + k for k in stored]
+        self.store.genomes[rows] = self.store.genomes[sources]
+        self.store.fitness[rows] = self.store.fitness[sources]
+        for k, individual in enumerate(population):
+            if individual.index is None:
+                self.store.write(first_row + k, individual.to_genome(), individual.fitness)
+            individual.index = first_row + k
+
+    def replace(self, next_generation: List[Individual]) -> None:
+        """
+        Escribe la siguiente generacion por indice en el buffer siguiente (y
+        en sus filas del almacen) e intercambia los buffers
+        """
+        self.store_population(next_generation, self.next_first_row)
+        next_buffer = self.buffers[1 - self.buffer]
+        next_buffer[:] = next_generation
+        self.buffer = 1 - self.buffer
+        self.population = next_buffer
     
+    @property
+    def population(self) -> List[Individual]:
+        return self._population
+
+    @population.setter
+    def population(self, population: List[Individual]) -> None:
+        """
+        Al cambiar la poblacion se invalidan las estadisticas calculadas
+        """
+        self._population = population
+        self._fitness = None
+        self._statistics = None
+
+    @property
+    def fitness(self) -> ndarray:
+        """
+        Fitness de los individuos de la poblacion en su orden
+        """
+        if self._fitness is None:
+            self._fitness = array([individual.fitness for individual in self.population], dtype=float64)
+        return self._fitness
+
+    @property
+    def statistics(self) -> dict:
+        """
+        Estadisticas de la aptitud de la poblacion, calculadas en una sola
+        pasada sobre el vector de fitness y guardadas hasta que la poblacion
+        cambia. Los cuartiles y la mediana salen de un unico partition
+        """
+        if self._statistics is None:
+            fitness = self.fitness
+            size = len(fitness)
+            half = size // 2
+            kth = sorted({size // 4, max(half - 1, 0), half, min(3 * size // 4, size - 1)})
+            ordered = partition(fitness, kth)
+            if size % 2 == 0:
+                median = int((ordered[half] + ordered[half - 1]) / 2)
+            else:
+                median = int(ordered[half])
+            self._statistics = {
+                'best': int(fitness.argmin()),
+                'worst': int(fitness.argmax()),
+                'average': round(float(fitness.mean()), 9),
+                'median': median,
+                'std': round(float(fitness.std()), 9),
+                'quartiles': (float(ordered[size // 4]), float(ordered[min(3 * size // 4, size - 1)])),
+                'distinct': len(unique(fitness)),
+            }
+        return self._statistics
+
     @property
     def best_individual(self) -> Individual:
         """
         Devuelve el individuo mas apto de la poblacion
         """
-        fittest = self.population[0]
-        for individual in self.population:
-            if individual.fitness < fittest.fitness:
-                fittest = individual
-        return fittest
+        return self.population[self.statistics['best']]
 
     @property
     def worst_individual(self) -> Individual:
         """
         Devuelve el individuo menos apto de la poblacion
         """
-        worst = self.population[0]
-        for individual in self.population:
-            if individual.fitness > worst.fitness:
-                worst = individual
-        return worst
+        return self.population[self.statistics['worst']]
 
     @property
     def average_fitness(self) -> float:
         """
         Devuelve el promedio de aptitud de la poblacion
         """
-        total = 0
-        for individual in self.population:
-            total += individual.fitness
-        return round(total / len(self.population), 9)
+        return self.statistics['average']
 
     @property
     def median_fitness(self) -> float:
         """
         Devuelve la media de la aptitud de la poblacion
         """
-        fitness = [individual.fitness for individual in self.population]
-        fitness.sort()
-        if len(fitness) % 2 == 0:
-            return int((fitness[len(fitness) // 2] + fitness[len(fitness) // 2 - 1]) / 2)
-        else:
-            return int(fitness[len(fitness) // 2])
+        return self.statistics['median']
+
+    @property
+    def std_fitness(self) -> float:
+        """
+        Devuelve la desviacion estandar de la aptitud de la poblacion
+        """
+        return self.statistics['std']
+
+    @property
+    def quartiles_fitness(self) -> Tuple[float, float]:
+        """
+        Devuelve el primer y tercer cuartil de la aptitud de la poblacion
+        """
+        return self.statistics['quartiles']
+
+    @property
+    def distinct_fitness(self) -> int:
+        """
+        Devuelve el numero de valores de aptitud distintos en la poblacion
+        """
+        return self.statistics['distinct']
 
     def __str__(self) -> str:
         sting = ""
@@ -86,156 +407,323 @@ class Population(object):
     def __repr__(self) -> str:
         return f"Population: {self.population}"
         
-    def generate_population(self, num_individuals: int) -> List[Individual]:
+    def generate_population(self, num_individuals: int, first_row: int = 0) -> List[Individual]:
+        """
+        Genera la poblacion de individuos. Se reparte en bloques entre los
+        procesos del pool, que escriben los individuos en el almacen desde la
+        fila first_row, y se reciben a medida que terminan
+        """
+        return self.generate_rows(list(range(first_row, first_row + num_individuals)))
+
+    def generate_rows(self, rows: List[int], log_progress: bool = True) -> List[Individual]:
         """
-        Genera la poblacion de individuos
+        Genera individuos nuevos en las filas rows del almacen, ordenados por
+        fila
         """
         population = []
-        q_population = Queue(maxsize=num_individuals)
-        n = 0
-        while n < num_individuals:
-            process_generates: List[Process] = []
-            j = 0
-            while j < self.n_jobs and n < num_individuals:
-                process_generates.append(Process(target=self.generate_individual, args=(q_population,)))
-                process_generates[j].start()
-                j += 1
-            for k in range(len(process_generates)):
-                process_generates[k].join()
-            while not q_population.empty():
-                population.append(q_population.get())
-                n += 1
-            logger.info(f"Generando poblacion: {n}/{num_individuals}")
+        rows = [(getrandbits(32), row) for row in rows]
+        for rows_done in self.run_tasks(generate_into, self.chunks(rows), unordered=True):
+            population += [self.load_individual(row) for row in rows_done]
+            if log_progress:
+                logger.info(f"Generando poblacion: {len(population)}/{len(rows)}")
+        # mismo orden con cualquier reparto entre procesos
+        population.sort(key=lambda individual: individual.index)
         return population
 
-    def generate_individual(self, q_population: Queue) -> None:
+    def take(self, indices: ndarray) -> List[Individual]:
         """
-        Genera un individuo
+        Individuos de la poblacion en los indices dados
         """
-        # individual = Individual(self.space_width, self.area_factor, blocks=deepcopy(self.blocks))}
-        individual = Individual(self.space_width, blocks=deepcopy(self.blocks))
-        self.lock.acquire()
-        q_population.put(individual)
-        self.lock.release()
+        return [self.population[i] for i in indices.tolist()]
 
-    def selection_tournament(self, K: int, per_choose: float) -> List[Individual]:
+    def selection_weights(self, fitness: ndarray) -> ndarray:
         """
-        Genera una seleccion de padres por metodo del torneo
+        Peso proporcional de cada fitness, mayor para los mas aptos
         """
-        num_choose = int(len(self.population) * per_choose)
-        population_shuffe = deepcopy(self.population)
-        parents: List[Individual] = []
-        while len(parents) < num_choose:
-            shuffle(population_shuffe)
-            groups = [population_shuffe[i:i+K] for i in range(0, len(population_shuffe), K)]
-            for group in groups:
-                parent = self.selection_proporcional(num_choose=1, invs=group)
-                parents.append(parent[0])
-                if len(parents) >= num_choose:
-                    break
-            if len(parents) >= num_choose:
-                break 
-            if len(parents)/K < num_choose:
-                parents = self.selection_proporcional(invs=parents, num_choose=num_choose)
-                break
-            population_shuffe = deepcopy(parents)
-            parents = []
-        return parents
+        return fitness.max() - fitness + fitness.min()
 
-    def selection_elitist(self, num_choose: int = None, per_choose: float = None, invs: List[Individual] = None) -> List[Individual]:
+    def selection_tournament(self, K: int, per_choose: float) -> ndarray:
         """
-        Genera una seleccion de padres por metodo elistista
+        Genera una seleccion de padres por metodo del torneo: la poblacion
+        desordenada se reparte en grupos de K (una matriz de indices) y en cada
+        grupo gana un individuo por seleccion proporcional. Devuelve los
+        indices de los padres
         """
-        if invs is None:
-            invs = deepcopy(self.population)
+        num_individuals = len(self.population)
+        num_choose = int(num_individuals * per_choose)
+        generator = default_rng(getrandbits(32))
+        K = max(1, min(K, num_individuals))
+        rounds = -(-num_choose * K // num_individuals)
+        groups = concatenate([generator.permutation(num_individuals) for _ in range(rounds)])
+        groups = groups[:num_choose * K].reshape(num_choose, K)
+        return self.selection_proporcional(num_choose=1, candidates=groups)[:, 0]
+
+    def selection_elitist(self, num_choose: int = None, per_choose: float = None, candidates: ndarray = None) -> ndarray:
+        """
+        Genera una seleccion de padres por metodo elistista. Devuelve los
+        indices de los num_choose mas aptos, del mas al menos apto
+        """
+        if candidates is None:
+            candidates = arange(len(self.population))
         if num_choose is None and per_choose is not None:
-            num_choose = int(len(invs) * per_choose)
-        fitness_population = [inv.fitness for inv in deepcopy(invs)]
-        parents: List[Individual] = []
-        for _ in range(num_choose):
-            index = fitness_population.index(min(fitness_population))
-            parents.append(invs[index])
-            fitness_population.pop(index)
-        return parents
+            num_choose = int(len(candidates) * per_choose)
+        num_choose = min(num_choose, len(candidates))
+        if num_choose == 0:
+            return candidates[:0]
+        fitness = self.fitness[candidates]
+        chosen = argpartition(fitness, num_choose - 1)[:num_choose]
+        return candidates[chosen[argsort(fitness[chosen], kind="stable")]]
 
-    def selection_proporcional(self, num_choose: int = None, per_choose: float = None, invs: List[Individual] = None) -> List[Individual]:
+    def selection_proporcional(self, num_choose: int = None, per_choose: float = None, candidates: ndarray = None) -> ndarray:
         """
-        Genera una seleccion de padreo por metodo proporcional
+        Genera una seleccion de padres por metodo proporcional sin reemplazo
+        (claves aleatorias u^(1/peso), se eligen las mayores). Con candidates
+        de dos dimensiones se eligen num_choose en cada fila. Devuelve los
+        indices de los elegidos
         """
-        if invs is None:
-            invs = deepcopy(self.population)
+        if candidates is None:
+            candidates = arange(len(self.population))
         if num_choose is None:
-            num_choose = int(len(invs) * per_choose)
-        sum_fitness = sum([inv.fitness for inv in invs])
-        parents: List[Individual] = []
-        per = [(self.worst_individual.fitness - inv.fitness + self.best_individual.fitness) / sum_fitness for inv in invs]
-        per_inv = [(per[i], deepcopy(invs[i])) for i in range(len(per))]
-        for _ in range(num_choose):
-            rulete = random()
-            for i in range(len(per_inv)):
-                if rulete <= per_inv[i][0]:
-                    parents.append(per_inv[i][1])
-                    per_inv.pop(i)
-                    break
-                if i == len(per_inv) - 1:
-                    parents.append(per_inv[i][1])
-                    per_inv.pop(i)
-                    break
-                if rulete > per_inv[i][0] and rulete <= per_inv[i+1][0]:
-                    parents.append(per_inv[i+1][1])
-                    per_inv.pop(i+1)
-                    break
-            per_inv = [
-                (per_inv[i][0] - per_inv[i][1].fitness / sum_fitness, per_inv[i][1]) 
-                for i in range(len(per_inv))
-            ]
-        return parents
+            num_choose = int(candidates.shape[-1] * per_choose)
+        num_choose = min(num_choose, candidates.shape[-1])
+        if num_choose == 0:
+            return candidates[..., :0]
+        generator = default_rng(getrandbits(32))
+        weights = self.selection_weights(self.fitness)[candidates]
+        keys = log(generator.random(candidates.shape)) / weights
+        chosen = argpartition(-keys, num_choose - 1, axis=-1)[..., :num_choose]
+        return take_along_axis(candidates, chosen, axis=-1)
+
+    def key(self, individual: Individual) -> bytes:
+        """
+        Clave del cache del genoma de un individuo, None sin cache
+        """
+        return None if self.fitness_cache is None else self.fitness_cache.key(individual.to_genome())
+
+    def population_keys(self) -> set:
+        """
+        Claves del cache de los genomas de la poblacion, vacio sin cache
+        """
+        if self.fitness_cache is None:
+            return set()
+        return {self.key(individual) for individual in self.population}
+
+    def admit(self, key: bytes, seen: set) -> bool:
+        """
+        Decide si un hijo recien producido se conserva segun su clave del
+        cache: se descarta si repite un genoma de la poblacion o de otro hijo
+        (duplicado) o un genoma ya evaluado (acierto del cache), antes de
+        decodificarlo o evaluarlo. Los fallos se cuentan al evaluar
+        """
+        cache = self.fitness_cache
+        if cache is None:
+            return True
+        if key in seen:
+            cache.duplicates += 1
+            return False
+        seen.add(key)
+        if key in cache:
+            cache.get(key)
+            return False
+        return True
 
     def crossover(self, parents: List[Individual], per_children: float = None) -> List[Individual]:
         """
-        Genera los hijos por metodo de cruce
+        Genera los hijos por metodo de cruce. Con cache se descartan los
+        hijos repetidos o ya evaluados en cuanto se produce su genoma, sin
+        decodificarlo, y se cruzan las parejas siguientes. Se intentan a lo
+        sumo 2 * num_children cruces (en una poblacion convergida casi todos
+        los hijos son repetidos) y los hijos que faltan son individuos nuevos
         """
         num_children = int(len(parents) * per_children)
+        pairs = islice(sample_pairs(len(parents)), 2 * num_children)
+        posibilities = ((parents[i], parents[j]) for i, j in pairs)
+        seen = self.population_keys()
+        if self.type_encoding == "permutation":
+            children = self.crossover_permutation_rows(posibilities, num_children, seen)
+        else:
+            children = self.crossover_rows(posibilities, num_children, seen)
+        produced = {child.index for child in children}
+        free_rows = [
+            row for row in range(self.next_first_row, self.next_first_row + num_children)
+            if row not in produced
+        ]
+        if len(free_rows) > 0:
+            logger.debug(f"Individuos nuevos en lugar de hijos: {len(free_rows)}")
+            children += self.generate_rows(free_rows, log_progress=False)
+        return children
+
+    def crossover_rows(
+        self,
+        posibilities: Iterator[Tuple[Individual, Individual]],
+        num_children: int,
+        seen: set,
+    ) -> List[Individual]:
+        """
+        Cruza las parejas en los procesos del pool, los hijos se escriben en
+        las filas del almacen despues de la poblacion y solo vuelven sus filas.
+        Las filas de los cruces sin hijo valido o descartados por el cache se
+        reintentan con las parejas siguientes. Las semillas se sortean por
+        cruce en este proceso, por lo que los hijos son los mismos con
+        cualquier n_jobs
+        """
+        free_rows = list(range(self.next_first_row, self.next_first_row + num_children))
         children: List[Individual] = []
-        posibilities: List[Tuple[Individual, Individual]] = []
-        for i in range(len(parents)):
-            for j in range(len(parents)):
-                if i != j:
-                    posibilities.append((parents[i], parents[j]))
-        shuffle(posibilities)
-        while len(children) < num_children and len(posibilities) > 0:
-            child = posibilities[0][0].crossover(posibilities[0][1])
-            if child is not None:
-                children.append(child)
-            posibilities.pop(0)
+        while len(free_rows) > 0:
+            pairs = list(islice(posibilities, len(free_rows)))
+            if len(pairs) == 0:
+                break
+            crosses = [(getrandbits(32), i.index, j.index, row) for (i, j), row in zip(pairs, free_rows)]
+            tasks = self.chunks(crosses)
+            produced = []
+            for rows_done in self.run_tasks(crossover_into, tasks):
+                produced += rows_done
+            admitted = set()
+            for row in produced:
+                child = self.load_individual(row)
+                if self.admit(self.key(child), seen):
+                    children.append(child)
+                    admitted.add(row)
+            free_rows = [row for row in free_rows if row not in admitted]
         logger.debug(f"Children: {len(children)}")
         return children
 
-    @staticmethod
-    def mutation(children: List[Individual], mutation_rate) -> List[Individual]:
+    def crossover_permutation_rows(
+        self,
+        posibilities: Iterator[Tuple[Individual, Individual]],
+        num_children: int,
+        seen: set,
+    ) -> List[Individual]:
         """
-        Muta los hijos
+        Cruza las parejas con genoma de permutacion en este proceso, que es
+        barato, descarta con el cache los genomas repetidos o ya evaluados y
+        decodifica los demas en los procesos del pool. Las filas de los hijos
+        no validos se reintentan con las parejas siguientes
         """
-        for child in children:
-            child.mutate(mutation_rate=mutation_rate)
+        cache = self.fitness_cache
+        free_rows = list(range(self.next_first_row, self.next_first_row + num_children))
+        children: List[Individual] = []
+        exhausted = False
+        while len(free_rows) > 0 and not exhausted:
+            genotypes = []
+            keys = {}
+            while len(genotypes) < len(free_rows):
+                pair = next(posibilities, None)
+                if pair is None:
+                    exhausted = True
+                    break
+                permutation, rotations = pair[0].crossover_genotype(pair[1])
+                row = free_rows[len(genotypes)]
+                if cache is not None:
+                    keys[row] = cache.genotype_key(permutation, rotations)
+                    if not self.admit(keys[row], seen):
+                        continue
+                genotypes.append((row, permutation, rotations))
+            produced = set()
+            for decoded in self.run_tasks(decode_into, self.chunks(genotypes)):
+                for row, fitness in decoded:
+                    if cache is not None:
+                        cache.misses += 1
+                        cache.put(keys[row], fitness)
+                    if fitness is not None:
+                        children.append(self.load_individual(row))
+                        produced.add(row)
+            free_rows = [row for row in free_rows if row not in produced]
+        logger.debug(f"Children: {len(children)}")
         return children
 
+    def mutation(self, children: List[Individual], mutation_rate) -> List[Individual]:
+        """
+        Muta los hijos en los procesos del pool sobre el almacen y compacta
+        por gravedad una fraccion compact_rate de ellos
+        """
+        rows = [(getrandbits(32), child.index) for child in children]
+        tasks = [(chunk, mutation_rate, self.compact_rate) for chunk in self.chunks(rows)]
+        mutated = set()
+        for rows_done in self.run_tasks(mutate_into, tasks):
+            mutated.update(rows_done)
+        return [self.load_individual(child.index) if child.index in mutated else child for child in children]
+
+    def evaluate(self, individuals: List[Individual]) -> List[Individual]:
+        """
+        Evalua en una sola pasada sobre el tensor de sus genomas los
+        individuos sin fitness y actualiza su fitness. Los hijos y mutantes
+        son factibles por construccion, el tensor lo comprueba y descarta los
+        que no lo son.
+
+        Con cache se descartan antes los duplicados (de la poblacion o de
+        otro individuo evaluado, incluido el reflejo horizontal) y los
+        genomas ya evaluados toman su fitness del cache
+        """
+        if len(individuals) == 0:
+            return individuals
+        cache = self.fitness_cache
+        keys = [None] * len(individuals)
+        evaluated = []
+        pending = []
+        seen = self.population_keys()
+        for i, individual in enumerate(individuals):
+            if cache is not None:
+                keys[i] = self.key(individual)
+                if keys[i] in seen:
+                    cache.duplicates += 1
+                    continue
+                seen.add(keys[i])
+                if individual.fitness is None and keys[i] in cache:
+                    individual.fitness = cache.get(keys[i])
+                    if individual.fitness is None:
+                        # genoma ya evaluado como no factible
+                        continue
+            if individual.fitness is None:
+                if cache is not None:
+                    cache.misses += 1
+                pending.append(i)
+            evaluated.append(individual)
+        if len(pending) > 0:
+            tensor = PopulationTensor.from_genomes(
+                self.space_width,
+                self.blocks,
+                [individuals[i].to_genome() for i in pending],
+            )
+            feasible = tensor.feasible.tolist()
+            for i, fitness, is_feasible in zip(pending, tensor.fitness.tolist(), feasible):
+                individuals[i].fitness = fitness if is_feasible else None
+                if cache is not None:
+                    cache.put(keys[i], individuals[i].fitness)
+            if not all(feasible):
+                logger.warning(f"Individuos no factibles descartados: {feasible.count(False)}")
+                evaluated = [individual for individual in evaluated if individual.fitness is not None]
+        for individual in evaluated:
+            self.store.fitness[individual.index] = individual.fitness
+        return evaluated
+
     def replacement_gap(self, children: List[Individual]) -> List[Individual]:
         """
         Reemplaza la poblacion con el metodo GAP
         """
         children = [c for c in children if c.fitness < self.worst_individual.fitness]
         gap = len(self.population) - len(children)
-        next_generation = deepcopy(children)
+        next_generation = children
         if gap > 0:
-            next_generation += self.selection_elitist(num_choose=gap)
+            next_generation += self.take(self.selection_elitist(num_choose=gap))
         return next_generation
             
+    def replacement_migrants(self, migrants: List[Individual]) -> List[Individual]:
+        """
+        Reemplaza a los peores individuos de la poblacion por los inmigrantes
+        """
+        worst_first = sorted(self.population, key=lambda individual: individual.fitness, reverse=True)
+        num_replaced = min(len(migrants), len(self.population))
+        return worst_first[num_replaced:] + migrants[:num_replaced]
+
     def replacement_final_judgment(self, survivors: int = 1) -> List[Individual]:
         """
         Reemplaza la poblacion con el meotodo juicio final
         """
-        next_generation = self.selection_elitist(num_choose=survivors)
+        next_generation = self.take(self.selection_elitist(num_choose=survivors))
         num_new_invividuals = len(self.population) - len(next_generation)
-        next_generation += self.generate_population(num_new_invividuals)
+        next_generation += self.generate_population(
+            num_new_invividuals,
+            first_row=self.next_first_row + len(next_generation),
+        )
         return next_generation
@@ -0,0 +1,132 @@
+"""
+Representacion de una poblacion completa como un tensor de NumPy para
+evaluarla en una sola pasada vectorizada
+"""
+from typing import List
+
+from numpy import (
+    ndarray, stack, zeros, ones, int64, bool_, argsort, take_along_axis, diff, triu,
+)
+
+from coating_mod_2d.block import Block
+from genetic.genome_store import GENE_N, GENE_LEFT, GENE_BOTTOM, GENE_ROTATION
+
+# campos de cada bloque del tensor
+LEFT, BOTTOM, WIDTH, HEIGHT = range(4)
+
+
+class PopulationTensor(object):
+    """
+    Poblacion como tensor (individuo x bloque x [left, bottom, width, height])
+    mas los n de cada bloque, construido desde los genomas compactos
+    """
+    def __init__(self, space_width: int, blocks: List[Block], genomes: ndarray) -> None:
+        self.space_width = space_width
+        if genomes.ndim == 2:
+            genomes = genomes[None]
+        num_blocks = max(block.n for block in blocks)
+        widths = zeros(num_blocks + 1, dtype=int64)
+        heights = zeros(num_blocks + 1, dtype=int64)
+        for block in blocks:
+            widths[block.n] = block.width
+            heights[block.n] = block.height
+        self.n = genomes[:, :, GENE_N].astype(int64)
+        rotation = genomes[:, :, GENE_ROTATION].astype(bool_)
+        self.tensor = zeros(genomes.shape[:2] + (4,), dtype=int64)
+        self.tensor[:, :, LEFT] = genomes[:, :, GENE_LEFT]
+        self.tensor[:, :, BOTTOM] = genomes[:, :, GENE_BOTTOM]
+        self.tensor[:, :, WIDTH] = widths[self.n]
+        self.tensor[:, :, HEIGHT] = heights[self.n]
+        self.tensor[rotation, WIDTH] = heights[self.n][rotation]
+        self.tensor[rotation, HEIGHT] = widths[self.n][rotation]
+
+    @classmethod
+    def from_genomes(cls, space_width: int, blocks: List[Block], genomes: List[ndarray]) -> "PopulationTensor":
+        """
+        Construye el tensor desde una lista de genomas
+        """
+        return cls(space_width, blocks, stack(genomes))
+
+    def __len__(self) -> int:
+        return self.tensor.shape[0]
+
+    @property
+    def left(self) -> ndarray:
+        return self.tensor[:, :, LEFT]
+
+    @property
+    def bottom(self) -> ndarray:
+        return self.tensor[:, :, BOTTOM]
+
+    @property
+    def right(self) -> ndarray:
+        return self.tensor[:, :, LEFT] + self.tensor[:, :, WIDTH] - 1
+
+    @property
+    def top(self) -> ndarray:
+        return self.tensor[:, :, BOTTOM] + self.tensor[:, :, HEIGHT] - 1
+
+    @property
+    def fitness(self) -> ndarray:
+        """
+        Altura ocupada (top maximo) de cada individuo
+        """
+        return self.top.max(axis=1)
+
+    @property
+    def area_ocupped(self) -> ndarray:
+        """
+        Area ocupada por los bloques de cada individuo
+        """
+        return (self.tensor[:, :, WIDTH] * self.tensor[:, :, HEIGHT]).sum(axis=1)
+
+    @property
+    def area_not_ocupped(self) -> ndarray:
+        """
+        Area libre bajo la altura ocupada de cada individuo, con la misma
+        formula que Space
+        """
+        return (self.space_width + 1) * self.fitness - self.area_ocupped
+
+    @property
+    def out_of_bounds(self) -> ndarray:
+        """
+        Numero de bloques fuera de los limites del espacio de cada individuo
+        """
+        outside = (self.left < 0) | (self.right >= self.space_width) | (self.bottom < 0)
+        return outside.sum(axis=1)
+
+    @property
+    def overlaps(self) -> ndarray:
+        """
+        Numero de pares de bloques que se solapan en cada individuo, en una
+        sola pasada sobre la poblacion: matriz (individuo x bloque x bloque)
+        de solapes por broadcasting, contando solo los pares i < j
+        """
+        left, right = self.left[:, :, None], self.right[:, :, None]
+        bottom, top = self.bottom[:, :, None], self.top[:, :, None]
+        overlap = (
+            (left <= right.transpose(0, 2, 1)) & (left.transpose(0, 2, 1) <= right)
+            & (bottom <= top.transpose(0, 2, 1)) & (bottom.transpose(0, 2, 1) <= top)
+        )
+        pairs = triu(ones(overlap.shape[1:], dtype=bool_), k=1)
+        return (overlap & pairs).sum(axis=(1, 2))
+
+    @property
+    def order_violations(self) -> ndarray:
+        """
+        Numero de bloques fuera de orden en cada individuo: con los bloques
+        ordenados por n, los que tienen bottom menor que el anterior. Es 0 si
+        y solo si ningun n menor queda mas arriba que un n mayor
+        """
+        order = argsort(self.n, axis=1)
+        bottoms = take_along_axis(self.bottom, order, axis=1)
+        return (diff(bottoms, axis=1) < 0).sum(axis=1)
+
+    @property
+    def feasible(self) -> ndarray:
+        """
+        Indica los individuos sin bloques fuera del espacio, solapados ni
+        fuera de orden
+        """
+        return (self.out_of_bounds == 0) & (self.overlaps == 0) & (self.order_violations == 0)
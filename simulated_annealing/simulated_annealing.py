@@ -2,15 +2,53 @@
 Clase para el algoritmo de enfriamiento simulado
 """
 from math import exp
-from typing import List
+from typing import List, Tuple, Optional
 from copy import deepcopy
 from time import perf_counter
-from random import random
+from random import random, seed, getrandbits
+from multiprocessing.pool import Pool
 from loguru import logger
 
 from coating_mod_2d.block import Block
+from coating_mod_2d.permutation import mutate_genome
 from simulated_annealing.solution import Solution
 
+# configuracion del problema en cada proceso del pool, se carga una sola vez
+worker_config = {}
+
+def init_worker(space_width: int, blocks: List[Block], type_space: str) -> None:
+    """
+    Inicializa un proceso del pool con la configuracion del problema
+    """
+    worker_config['space_width'] = space_width
+    worker_config['blocks'] = blocks
+    worker_config['type_space'] = type_space
+
+def evaluate_genome(genome: Tuple[List[int], List[int]]) -> Optional[Tuple[int, List[Block]]]:
+    """
+    Fitness y bloques localizados de un genoma de permutacion en un proceso
+    del pool, None si no es valido
+    """
+    permutation, rotations = genome
+    solution = Solution(
+        worker_config['space_width'],
+        worker_config['blocks'],
+        type_space=worker_config['type_space'],
+        type_encoding="permutation",
+        permutation=permutation,
+        rotations=rotations,
+    )
+    return (solution.fitness, solution.space.blocks_in) if solution.feasible else None
+
+def anneal_chain(task: Tuple["SimulatedAnnealing", int, int]) -> "SimulatedAnnealing":
+    """
+    Itera una cadena de parallel tempering en un proceso del pool
+    """
+    chain, steps, task_seed = task
+    seed(task_seed)
+    chain.anneal(steps)
+    return chain
+
 class SimulatedAnnealing:
     def __init__(
         self,
@@ -24,7 +62,31 @@ class SimulatedAnnealing:
         iterations: int,
         compute_time: int,
         n_jobs: int,
+        type_space: str = "grid",
+        type_encoding: str = "position",
+        num_chains: int = 1,
+        swap_interval: int = 100,
+        temperature_ratio: float = 2.0,
+        batch_size: int = 1,
+        compact_rate: float = 0.0,
     ) -> None:
+        """
+        Con num_chains > 1 se usa parallel tempering: num_chains cadenas, la
+        c-esima con temperatura inicial T_init * temperature_ratio**c, iteran
+        en un pool de n_jobs procesos e intercambian sus soluciones entre
+        temperaturas vecinas cada swap_interval iteraciones.
+
+        En cada iteracion se evaluan batch_size vecinos y el mejor pasa por
+        el criterio de Metropolis. Con la codificacion por permutacion y
+        n_jobs > 1 los vecinos se evaluan en un pool de procesos.
+
+        Con la codificacion por posicion, en una fraccion compact_rate de las
+        iteraciones se propone ademas la compactacion por gravedad del layout
+        """
+        if num_chains < 1:
+            raise ValueError("num_chains debe ser mayor o igual a 1")
+        if batch_size < 1:
+            raise ValueError("batch_size debe ser mayor o igual a 1")
         self.space_width = space_width
         self.blocks = blocks
         self.type_update = type_update
@@ -37,6 +99,17 @@ class SimulatedAnnealing:
         self.iterations = iterations
         self.compute_time = compute_time
         self.n_jobs = n_jobs
+        self.type_space = type_space
+        self.type_encoding = type_encoding
+        self.num_chains = num_chains
+        self.swap_interval = swap_interval
+        self.temperature_ratio = temperature_ratio
+        self.batch_size = batch_size
+        self.compact_rate = compact_rate
+        self.pool: Pool = None
+        self.chains: List[SimulatedAnnealing] = []
+        self.chain_fitnesses: List[List[int]] = []
+        self.chain_Ts: List[List[float]] = []
 
         self.actual_solution: Solution = None
         self.actual_fitness = 0
@@ -54,30 +127,59 @@ class SimulatedAnnealing:
         Funcion para ejecutar el algoritmo de enfriamiento simulado
         """
         logger.info("Iniciando algoritmo de enfriamiento simulado")
-        self.best_solution = Solution(self.space_width, deepcopy(self.blocks)) 
+        self.start_solution()
+        logger.info(f"Fitness inicial: {self.best_fitness}")
+        self.T = self.T_init
+        if self.num_chains > 1:
+            self.parallel_tempering()
+        else:
+            self.simulated_annealing()
+
+    def start_solution(self) -> None:
+        """
+        Genera la solucion inicial
+        """
+        self.best_solution = Solution(
+            self.space_width,
+            deepcopy(self.blocks),
+            type_space=self.type_space,
+            type_encoding=self.type_encoding,
+        )
         self.best_fitness = self.best_solution.fitness
-        self.actual_solution = self.best_solution
+        self.actual_solution = self.best_solution.copy() if self.type_encoding == "position" else self.best_solution
         self.actual_fitness = self.best_fitness
-        logger.info(f"Fitness inicial: {self.best_fitness}")
-        self.simulated_annealing()
 
     def simulated_annealing(self) -> None:
         """
         Funcion para ejecutar el algoritmo de enfriamiento simulado
         """
-        self.T = self.T_init
-        while True:
-            new_solution = self.mutate(self.actual_solution)
-            new_fitness = new_solution.fitness
-            if new_fitness < self.best_fitness:
-                self.best_solution = new_solution
-                self.best_fitness = new_fitness
-                self.actual_solution = new_solution
-                self.actual_fitness = new_fitness
+        if self.type_encoding == "permutation" and self.batch_size > 1 and self.n_jobs > 1:
+            self.pool = Pool(
+                processes=self.n_jobs,
+                initializer=init_worker,
+                initargs=(self.space_width, self.blocks, self.type_space),
+            )
+        try:
+            self.anneal()
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def anneal(self, steps: int = None) -> None:
+        """
+        Itera hasta la condicion de parada o hasta completar steps iteraciones
+        """
+        step = 0
+        while steps is None or step < steps:
+            step += 1
+            if self.type_encoding == "permutation" and self.batch_size > 1:
+                self.step_solution_batch()
+            elif self.type_encoding == "permutation":
+                self.step_solution()
             else:
-                if random() < self.acceptance_probability(new_fitness):
-                    self.actual_solution = new_solution
-                    self.actual_fitness = new_fitness
+                self.step_move()
 
             self.info()
             self.actual_fitnesses.append(self.actual_fitness)
@@ -89,6 +191,167 @@ class SimulatedAnnealing:
             if self.stop_condition():
                 break
 
+    def parallel_tempering(self) -> None:
+        """
+        Parallel tempering: las cadenas iteran en paralelo por tramos de
+        swap_interval iteraciones y entre tramos se proponen intercambios de
+        soluciones entre temperaturas vecinas
+        """
+        self.chains = [self.new_chain(c) for c in range(self.num_chains)]
+        self.chain_fitnesses = [[] for _ in self.chains]
+        self.chain_Ts = [[] for _ in self.chains]
+        with Pool(processes=max(1, min(self.n_jobs, self.num_chains))) as pool:
+            while True:
+                tasks = [(chain, self.swap_interval, getrandbits(32)) for chain in self.chains]
+                self.chains = pool.map(anneal_chain, tasks)
+                for c, chain in enumerate(self.chains):
+                    self.chain_fitnesses[c] += chain.actual_fitnesses
+                    self.chain_Ts[c] += chain.Ts
+                    chain.actual_fitnesses = []
+                    chain.Ts = []
+                    if chain.best_fitness < self.best_fitness:
+                        self.best_solution = chain.best_solution
+                        self.best_fitness = chain.best_fitness
+                self.swap_chains()
+                self.i = self.chains[0].i
+                self.T = self.chains[0].T
+                self.actual_solution = self.chains[0].actual_solution
+                self.actual_fitness = self.chains[0].actual_fitness
+                self.info()
+                if self.stop_condition() or all(chain.stop_condition() for chain in self.chains):
+                    break
+        self.actual_fitnesses = self.chain_fitnesses[0]
+        self.Ts = self.chain_Ts[0]
+
+    def new_chain(self, c: int) -> "SimulatedAnnealing":
+        """
+        Cadena c de parallel tempering, parte desde una copia de la solucion inicial
+        """
+        chain = SimulatedAnnealing(
+            self.space_width,
+            self.blocks,
+            type_update=self.type_update,
+            T_init=self.T_init * self.temperature_ratio ** c,
+            T_end=self.T_end,
+            k=self.k,
+            type_stop=self.type_stop,
+            iterations=self.iterations,
+            compute_time=self.compute_time,
+            n_jobs=1,
+            type_space=self.type_space,
+            type_encoding=self.type_encoding,
+            batch_size=self.batch_size,
+            compact_rate=self.compact_rate,
+        )
+        chain.start = self.start
+        chain.T = chain.T_init
+        chain.best_solution = self.best_solution
+        chain.best_fitness = self.best_fitness
+        chain.actual_solution = self.actual_solution.copy() if self.type_encoding == "position" else self.actual_solution
+        chain.actual_fitness = self.actual_fitness
+        return chain
+
+    def swap_chains(self) -> None:
+        """
+        Propone intercambiar las soluciones actuales de cada par de cadenas
+        vecinas con la probabilidad de Metropolis del parallel tempering
+        """
+        for c in range(len(self.chains) - 1):
+            cold, hot = self.chains[c], self.chains[c+1]
+            exponent = (1 / cold.T - 1 / hot.T) * (cold.actual_fitness - hot.actual_fitness)
+            if exponent >= 0 or random() < exp(exponent):
+                cold.actual_solution, hot.actual_solution = hot.actual_solution, cold.actual_solution
+                cold.actual_fitness, hot.actual_fitness = hot.actual_fitness, cold.actual_fitness
+                logger.debug(f"Intercambio entre las cadenas {c} y {c+1}")
+
+    def step_solution(self) -> None:
+        """
+        Iteracion que construye una solucion vecina nueva
+        """
+        new_solution = self.mutate(self.actual_solution)
+        new_fitness = new_solution.fitness
+        if new_fitness < self.best_fitness:
+            self.best_solution = new_solution
+            self.best_fitness = new_fitness
+            self.actual_solution = new_solution
+            self.actual_fitness = new_fitness
+        else:
+            if random() < self.acceptance_probability(new_fitness):
+                self.actual_solution = new_solution
+                self.actual_fitness = new_fitness
+
+    def step_solution_batch(self) -> None:
+        """
+        Iteracion que evalua batch_size genomas vecinos, en el pool si
+        existe, y propone el mejor valido. Cada genoma se decodifica una sola
+        vez: el pool devuelve los bloques localizados del vecino y la solucion
+        aceptada se reconstruye desde ellos
+        """
+        genomes = [
+            mutate_genome(self.actual_solution.permutation, self.actual_solution.rotations)
+            for _ in range(self.batch_size)
+        ]
+        if self.pool is not None:
+            evaluated = self.pool.map(evaluate_genome, genomes)
+            solutions = [
+                None if result is None else Solution.from_layout(
+                    self.space_width, self.blocks, result[1], *genome, type_space=self.type_space,
+                )
+                for genome, result in zip(genomes, evaluated)
+            ]
+        else:
+            solutions = [self.solution_from_genome(*genome) for genome in genomes]
+        candidates = [
+            (solution.fitness, i) for i, solution in enumerate(solutions)
+            if solution is not None and solution.feasible
+        ]
+        if len(candidates) == 0:
+            return
+        new_fitness, best = min(candidates)
+        if new_fitness < self.best_fitness or random() < self.acceptance_probability(new_fitness):
+            self.actual_solution = solutions[best]
+            self.actual_fitness = new_fitness
+            if new_fitness < self.best_fitness:
+                self.best_solution = self.actual_solution
+                self.best_fitness = new_fitness
+
+    def solution_from_genome(self, permutation: List[int], rotations: List[int]) -> Solution:
+        """
+        Solucion decodificada desde un genoma de permutacion
+        """
+        return Solution(
+            self.space_width,
+            self.blocks,
+            type_space=self.type_space,
+            type_encoding=self.type_encoding,
+            permutation=permutation,
+            rotations=rotations,
+        )
+
+    def step_move(self) -> None:
+        """
+        Iteracion con movimientos sobre la solucion actual: se proponen
+        batch_size movimientos, se evalua su variacion de fitness sin
+        aplicarlos y el mejor se aplica en su lugar si se acepta
+        """
+        proposals = [self.actual_solution.random_proposal() for _ in range(self.batch_size)]
+        if self.compact_rate > 0 and random() < self.compact_rate:
+            proposals.append(self.actual_solution.propose_compact())
+        proposals = [moves for moves in proposals if moves is not None]
+        if len(proposals) == 0:
+            return
+        deltas = self.actual_solution.deltas(proposals)
+        best = deltas.index(min(deltas))
+        new_fitness = self.actual_fitness + deltas[best]
+        if new_fitness < self.best_fitness:
+            self.actual_solution.move(proposals[best])
+            self.best_solution = self.actual_solution.copy()
+            self.best_fitness = new_fitness
+            self.actual_fitness = new_fitness
+        elif random() < self.acceptance_probability(new_fitness):
+            self.actual_solution.move(proposals[best])
+            self.actual_fitness = new_fitness
+
     def stop_condition(self) -> bool:
         """
         Funcion para calcular la condicion de parada
@@ -133,11 +396,12 @@ class SimulatedAnnealing:
 
     def acceptance_probability(self, new_fitness: float) -> float:
         """
-        Funcion para calcular la probabilidad de aceptacion
+        Funcion para calcular la probabilidad de aceptacion (Metropolis
+        respecto de la solucion actual)
         """
-        if new_fitness < self.best_fitness:
+        if new_fitness < self.actual_fitness:
             return 1.0
-        return self.probability(self.best_fitness, new_fitness, self.T)
+        return self.probability(self.actual_fitness, new_fitness, self.T)
 
     def probability(self, fitness: float, new_fitness: float, T: float) -> float:
         """
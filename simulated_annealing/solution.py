@@ -1,27 +1,79 @@
 """
 Clase para una solucion
 """
-from random import random, shuffle, randint
-from typing import List
-from copy import deepcopy
+from random import random, randint, choice
+from numpy import unique, arange, flatnonzero, argpartition
+from typing import List, Tuple, Optional
+from copy import copy, deepcopy
 from loguru import logger
 
 from coating_mod_2d.block import Block
-from coating_mod_2d.space import Space
+from coating_mod_2d.space import new_space, BOTTOM, TOP
+from coating_mod_2d.permutation import decode, random_genome, mutate_genome
 
 class Solution:
     def __init__(
         self, 
         space_width: int,
         blocks: List[Block],
+        type_space: str = "grid",
+        type_encoding: str = "position",
+        permutation: List[int] = None,
+        rotations: List[int] = None,
     ) -> None:
         """
-        Clase de solucion
+        Clase de solucion. Con type_encoding = "permutation" la solucion es
+        una permutacion de los bloques con un bit de rotacion por bloque
+        decodificada sobre blocks
         """
-        self.space = Space(width=space_width, all_blocks=deepcopy(blocks))
-        self.solution = self.generate_individual(deepcopy(blocks))
+        self.type_space = type_space
+        self.type_encoding = type_encoding
+        self.feasible = True
+        self.space = new_space(type_space, width=space_width, all_blocks=deepcopy(blocks))
+        if type_encoding == "permutation":
+            self.blocks = blocks
+            if permutation is None:
+                permutation, rotations = random_genome(blocks)
+                if not decode(self.space, blocks, permutation, rotations):
+                    # el orden de los n siempre tiene decodificacion valida
+                    permutation = sorted(permutation)
+                    self.space = new_space(type_space, width=space_width, all_blocks=blocks)
+                    decode(self.space, blocks, permutation, rotations)
+            else:
+                self.feasible = decode(self.space, blocks, permutation, rotations)
+            self.permutation = permutation
+            self.rotations = rotations
+        else:
+            self.solution = self.generate_individual(deepcopy(blocks))
         self.fitness = self.get_fitness()
-        
+
+    @classmethod
+    def from_layout(
+        cls,
+        space_width: int,
+        blocks: List[Block],
+        fenotype: List[Block],
+        permutation: List[int],
+        rotations: List[int],
+        type_space: str = "grid",
+    ) -> "Solution":
+        """
+        Solucion con genoma de permutacion construida desde los bloques ya
+        localizados de su decodificacion, sin volver a decodificarla
+        """
+        solution = cls.__new__(cls)
+        solution.type_space = type_space
+        solution.type_encoding = "permutation"
+        solution.feasible = True
+        solution.blocks = blocks
+        solution.space = new_space(type_space, width=space_width, all_blocks=blocks)
+        for block in fenotype:
+            solution.space.add_block(block)
+        solution.permutation = permutation
+        solution.rotations = rotations
+        solution.fitness = solution.get_fitness()
+        return solution
+
     def generate_individual(self, blocks: List[Block]) -> None:
         """
         Genera un individuo
@@ -30,30 +82,19 @@ class Solution:
             blockp = deepcopy(block)
             if random() < 0.5:
                 blockp.rotate()
-            assign = False
-            ys = [y for y in range(self.space.height_ocupped + 15)]
-            shuffle(ys)
-            for bottom in ys:
-                xs = [x for x in range(self.space.width - blockp.width + 1)]
-                shuffle(xs)
-                for left in xs:
-                    blockp.localize(left, bottom)
-                    assign = self.is_valid_block(blockp)
-                    if assign:
-                        self.space.add_block(blockp)
-                        break
-                if assign:
-                    break
+            low, high = self.space.bottom_range(blockp.n)
+            lefts, bottoms = self.space.free_positions(blockp, low, min(self.space.height_ocupped + 15, high + 1))
+            if len(bottoms) > 0:
+                bottom = choice(unique(bottoms).tolist())
+                left = choice(lefts[bottoms == bottom].tolist())
+                blockp.localize(left, bottom)
+                self.space.add_block(blockp)
 
     def is_valid_block(self, block: Block) -> bool:
         """
         Valida el bloque en el espacio
         """
-        for block_in_space in self.space.blocks_in:
-            if block_in_space.n != block.n:
-                if block.intersection(block_in_space) or not self.space.is_valid_block(block):
-                    return False
-        return True
+        return self.space.is_valid_position(block)
 
     def validate(self) -> bool:
         """
@@ -64,28 +105,177 @@ class Solution:
                 return False
         return True
 
+    def copy(self) -> "Solution":
+        """
+        Copia de la solucion con un snapshot copy-on-write del espacio
+        """
+        solution = copy(self)
+        solution.space = self.space.snapshot()
+        return solution
+
     def mutate(self) -> "Solution":
         """
-        Mutacion de un individuo
-        """
-        
-        while True:
-            blocks_shuffled = deepcopy(self.space.blocks_in)
-            shuffle(blocks_shuffled)
-            for block in blocks_shuffled:
-                if random() < 0.5:
-                    block.rotate()
-                assign = False
-                left_p =  randint(0, self.space.width - self.space.blocks_in[block.n-1].width)
-                bottom_p = randint(0, self.space.height_ocupped)
-                block.localize(left_p, bottom_p)
-                assign = self.is_valid_block(block)
-                if assign:
-                    self.space.blocks_in[block.n-1] = block
-                    break
-            if assign:
-                break
-        return Solution(self.space.width, self.space.blocks_in)
+        Vecino de la solucion: una copia que comparte el espacio con ella
+        salvo por un movimiento al azar (random_proposal)
+        """
+        if self.type_encoding == "permutation":
+            return self.mutate_permutation()
+        neighbour = self.copy()
+        moves = neighbour.random_proposal()
+        if moves is not None:
+            neighbour.move(moves)
+        return neighbour
+
+    def mutate_permutation(self, tryings: int = 100) -> "Solution":
+        """
+        Vecino de una solucion con genoma de permutacion (swap, insert o
+        rotate-flip). Si ningun intento es valido devuelve la misma solucion
+        """
+        for t in range(tryings):
+            permutation, rotations = mutate_genome(self.permutation, self.rotations)
+            solution = Solution(
+                self.space.width,
+                self.blocks,
+                type_space=self.type_space,
+                type_encoding=self.type_encoding,
+                permutation=permutation,
+                rotations=rotations,
+            )
+            if solution.feasible:
+                return solution
+        return self
+
+    def move(self, moves: List[Tuple[int, Block]]) -> int:
+        """
+        Aplica en su lugar un movimiento ya validado (index, bloque nuevo) y
+        devuelve la variacion del fitness
+        """
+        fitness = self.fitness
+        self.space.relocate_blocks(moves)
+        self.fitness = self.get_fitness()
+        return self.fitness - fitness
+
+    def propose_relocate(self, index: int, left: int, bottom: int) -> Optional[List[Tuple[int, Block]]]:
+        """
+        Movimiento del bloque index a (left, bottom). None si no es valido
+        """
+        block = self.space.blocks_in[index].copy()
+        if left < 0 or left + block.width > self.space.width:
+            return None
+        block.localize(left, bottom)
+        if not self.is_valid_block(block):
+            return None
+        return [(index, block)]
+
+    def propose_rotate(self, index: int) -> Optional[List[Tuple[int, Block]]]:
+        """
+        Rotacion del bloque index sobre su esquina inferior, corriendolo a la
+        izquierda si no cabe. None si no es valida
+        """
+        block = self.space.blocks_in[index].copy()
+        block.rotate()
+        left = min(block.left, self.space.width - block.width)
+        block.localize(left, block.bottom)
+        if not self.is_valid_block(block):
+            return None
+        return [(index, block)]
+
+    def propose_swap(self, index: int, other: int) -> Optional[List[Tuple[int, Block]]]:
+        """
+        Intercambio de las posiciones de dos bloques con el mismo bottom (el
+        orden de los bloques no permite intercambiar bloques de filas
+        distintas). None si no es valido
+        """
+        block = self.space.blocks_in[index].copy()
+        block_other = self.space.blocks_in[other].copy()
+        if index == other or block.bottom != block_other.bottom:
+            return None
+        left, left_other = block_other.left, block.left
+        if left + block.width > self.space.width or left_other + block_other.width > self.space.width:
+            return None
+        block.localize(left, block.bottom)
+        block_other.localize(left_other, block_other.bottom)
+        if block.intersection(block_other):
+            return None
+        if not self.space.valid_positions(block, left, block.bottom, ignore=(block_other.n,))[0]:
+            return None
+        if not self.space.valid_positions(block_other, left_other, block_other.bottom, ignore=(block.n,))[0]:
+            return None
+        return [(index, block), (other, block_other)]
+
+    def propose_drop(self, index: int) -> Optional[List[Tuple[int, Block]]]:
+        """
+        Caida del bloque index en su columna hasta la fila valida mas baja.
+        None si no puede bajar
+        """
+        position = self.space.drop_position(index)
+        if position is None:
+            return None
+        block = self.space.blocks_in[index].copy()
+        block.localize(*position)
+        return [(index, block)]
+
+    def propose_compact(self, slide_left: bool = True) -> Optional[List[Tuple[int, Block]]]:
+        """
+        Compactacion por gravedad de todo el layout, calculada sobre un
+        snapshot del espacio. None si ningun bloque puede bajar
+        """
+        moves = self.space.snapshot().compact(slide_left)
+        return moves if len(moves) > 0 else None
+
+    def random_proposal(self, tryings: int = 100) -> Optional[List[Tuple[int, Block]]]:
+        """
+        Movimiento al azar (relocate, rotate, swap o drop) de un bloque sin
+        aplicarlo. None si ningun intento es valido
+        """
+        for t in range(tryings):
+            index = randint(0, len(self.space.blocks_in) - 1)
+            operator = randint(0, 3)
+            if operator == 0:
+                block = self.space.blocks_in[index]
+                low, high = self.space.bottom_range(block.n)
+                moves = self.propose_relocate(
+                    index,
+                    randint(0, self.space.width - block.width),
+                    randint(low, min(high, self.space.height_ocupped)),
+                )
+            elif operator == 1:
+                moves = self.propose_rotate(index)
+            elif operator == 2:
+                coords = self.space.coords[:len(self.space.blocks_in)]
+                same_row = flatnonzero(coords[:, BOTTOM] == coords[index, BOTTOM])
+                moves = self.propose_swap(index, int(choice(same_row)))
+            else:
+                moves = self.propose_drop(index)
+            if moves is not None:
+                return moves
+        return None
+
+    def highest_tops(self, num_tops: int = 3) -> List[Tuple[int, int]]:
+        """
+        Los num_tops tops mas altos (top, index) de los bloques, de mayor a menor
+        """
+        tops = self.space.coords[:len(self.space.blocks_in), TOP]
+        if len(tops) > num_tops:
+            indexes = argpartition(tops, len(tops) - num_tops)[-num_tops:]
+        else:
+            indexes = arange(len(tops))
+        return sorted(((int(tops[i]), int(i)) for i in indexes), reverse=True)
+
+    def deltas(self, proposals: List[List[Tuple[int, Block]]]) -> List[int]:
+        """
+        Variacion del fitness de cada movimiento sin aplicarlos. La altura sin
+        los bloques movidos es el primero de los tops mas altos que no se mueve
+        """
+        num_moved = max((len(moves) for moves in proposals), default=0)
+        tops = self.highest_tops(num_moved + 1)
+        deltas = []
+        for moves in proposals:
+            moved = {index for index, _ in moves}
+            height = next((top for top, index in tops if index not in moved), 0)
+            height = max(height, max(block.top for _, block in moves), 0)
+            deltas.append(height - self.fitness)
+        return deltas
 
     def get_fitness(self) -> int:
         """